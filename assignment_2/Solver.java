@@ -1,6 +1,7 @@
 import java.io.*;
 import java.util.List;
 import java.util.ArrayList;
+import java.util.Arrays;
 
 /**
  * The class <code>Solver</code> is an implementation of a greedy algorithm to solve the knapsack problem.
@@ -13,7 +14,11 @@ public class Solver {
      */
     public static void main(String[] args) {
         try {
-            solve(args);
+            if(Arrays.asList(args).contains("-stream")){
+                stream();
+            } else {
+                solve(args);
+            }
         } catch (IOException e) {
             e.printStackTrace();
         }
@@ -47,8 +52,44 @@ public class Solver {
         finally {
             input.close();
         }
-        
-        
+
+        System.out.print(solveLines(lines));
+    }
+
+    /**
+     * Keep reading framed instances from the standard input until it is closed, writing a framed solution
+     * for each one. A frame is a line with the number of lines that follow, then those lines.
+     */
+    public static void stream() throws IOException {
+        BufferedReader input = new BufferedReader(new InputStreamReader(System.in));
+
+        String header = null;
+        while (( header = input.readLine()) != null){
+            header = header.trim();
+            if(header.isEmpty())
+                continue;
+
+            int numLines = Integer.parseInt(header);
+            List<String> lines = new ArrayList<String>(numLines);
+            for(int i=0; i < numLines; i++){
+                lines.add(input.readLine());
+            }
+
+            String[] solutionLines = solveLines(lines).split("\n");
+            StringBuilder frame = new StringBuilder();
+            frame.append(solutionLines.length).append("\n");
+            for(String line : solutionLines){
+                frame.append(line).append("\n");
+            }
+            System.out.print(frame);
+            System.out.flush();
+        }
+    }
+
+    /**
+     * Solve the instance given as the lines of an input file and return the solution in the output format
+     */
+    public static String solveLines(List<String> lines) {
         // parse the data in the file
         String[] firstLine = lines.get(0).split("\\s+");
         int items = Integer.parseInt(firstLine[0]);
@@ -82,10 +123,12 @@ public class Solver {
         }
         
         // prepare the solution in the specified output format
-        System.out.println(value+" 0");
+        StringBuilder output = new StringBuilder();
+        output.append(value+" 0").append("\n");
         for(int i=0; i < items; i++){
-            System.out.print(taken[i]+" ");
+            output.append(taken[i]+" ");
         }
-        System.out.println("");        
+        output.append("\n");
+        return output.toString();
     }
 }
\ No newline at end of file
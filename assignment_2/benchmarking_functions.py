@@ -0,0 +1,170 @@
+import os
+import time
+
+import numpy as np
+
+from assignment_2.data_processing_functions import load_input_data, load_multi_input_data
+from assignment_2.jit_functions import NUMBA_AVAILABLE
+from assignment_2.solving_functions import dynamic_programming_bottom_up, surrogate_greedy_multi, \
+    branch_and_bound_multi
+from assignment_2.subset_sum_functions import get_reachable_weights, get_largest_reachable_weight_from_bitset, \
+    count_reachable_weights
+
+DATA_DIRECTORY = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data')
+
+
+def load_data_file(file_name):
+    """
+    Return the [value, weight] array and capacity of a file in the data directory.
+    """
+
+    with open(os.path.join(DATA_DIRECTORY, file_name), 'r') as input_data_file:
+        input_data = input_data_file.read()
+
+    return load_input_data(input_data)
+
+
+def get_reachable_weights_numpy(weight_list, capacity):
+    """
+    Reference reachable weight computation over a NumPy boolean array, one byte per weight.
+    """
+
+    reachable_array = np.zeros(capacity + 1, dtype=bool)
+    reachable_array[0] = True
+    for weight in weight_list:
+        if weight <= capacity:
+            reachable_array[weight:] |= reachable_array[:capacity + 1 - weight].copy()
+
+    return reachable_array
+
+
+def benchmark_reachable_weights(file_name='ks_10000_0', num_runs=3):
+    """
+    Time the bitset reachable weight computation up to the capacity, against the NumPy boolean array version.
+    """
+
+    input_array, capacity = load_data_file(file_name)
+    weight_list = [int(weight) for weight in input_array[:, 1]]
+
+    bitset_times = []
+    numpy_times = []
+    for _ in range(num_runs):
+        start_time = time.time()
+        reachable = get_reachable_weights(weight_list, capacity)
+        bitset_times.append(time.time() - start_time)
+
+        start_time = time.time()
+        reachable_array = get_reachable_weights_numpy(weight_list, capacity)
+        numpy_times.append(time.time() - start_time)
+
+    result_dict = {
+        'file_name': file_name,
+        'num_items': len(weight_list),
+        'capacity': capacity,
+        'largest_reachable_weight': get_largest_reachable_weight_from_bitset(reachable, capacity),
+        'num_reachable_weights': count_reachable_weights(reachable),
+        'num_reachable_weights_numpy': int(reachable_array.sum()),
+        'bitset_time': min(bitset_times),
+        'numpy_time': min(numpy_times)
+    }
+
+    return result_dict
+
+
+def benchmark_dynamic_programming_kernels(max_cells=2 * 10 ** 9):
+    """
+    Time the bottom-up dynamic programming with the numba kernel against the numpy version on every file in
+    the data directory, skipping files whose table would have more than max_cells cells.
+    """
+
+    # compile the kernel first so it isn't counted in the timings
+    if NUMBA_AVAILABLE:
+        dynamic_programming_bottom_up(np.array([[1, 1]]), 1, use_jit=True)
+
+    result_list = []
+    for file_name in sorted(os.listdir(DATA_DIRECTORY)):
+        input_array, capacity = load_data_file(file_name)
+        result_dict = {'file_name': file_name, 'num_cells': input_array.shape[0] * (capacity + 1)}
+
+        if result_dict['num_cells'] <= max_cells:
+            start_time = time.time()
+            numpy_solution_dict = dynamic_programming_bottom_up(input_array, capacity, use_jit=False)
+            result_dict['numpy_time'] = time.time() - start_time
+            result_dict['total_value'] = numpy_solution_dict['total_value']
+
+            if NUMBA_AVAILABLE:
+                start_time = time.time()
+                jit_solution_dict = dynamic_programming_bottom_up(input_array, capacity, use_jit=True)
+                result_dict['jit_time'] = time.time() - start_time
+                result_dict['values_match'] = jit_solution_dict['total_value'] == numpy_solution_dict['total_value']
+
+        result_list.append(result_dict)
+
+    return result_list
+
+
+def generate_multi_instance(num_items, num_constraints, num_knapsacks, seed=0, tightness=0.5):
+    """
+    Return a random instance in the multi knapsack input format, with values correlated to the total weight
+    and each knapsack given tightness times its share of the total weight in every constraint.
+    """
+
+    rng = np.random.default_rng(seed)
+
+    weights = rng.integers(1, 1000, size=(num_items, num_constraints))
+    values = weights.sum(axis=1) // num_constraints + rng.integers(1, 500, size=num_items)
+    capacities = np.maximum((tightness * weights.sum(axis=0) / num_knapsacks).astype(int), 1)
+    capacities = np.tile(capacities, (num_knapsacks, 1))
+
+    lines = [str(num_items) + ' ' + str(num_constraints) + ' ' + str(num_knapsacks)]
+    lines += [' '.join(map(str, capacity_row)) for capacity_row in capacities]
+    lines += [str(value) + ' ' + ' '.join(map(str, weight_row)) for value, weight_row in zip(values, weights)]
+
+    return '\n'.join(lines) + '\n'
+
+
+def benchmark_multi_knapsack(max_time=10):
+    """
+    Compare the surrogate greedy and the surrogate bounded branch and bound on generated multi-dimensional
+    (one knapsack, several constraints) and multiple (several knapsacks, one constraint) instances.
+    """
+
+    instance_list = [
+        ('multi_dimensional_30_2_1', generate_multi_instance(30, 2, 1, seed=1)),
+        ('multi_dimensional_50_3_1', generate_multi_instance(50, 3, 1, seed=2)),
+        ('multi_dimensional_100_5_1', generate_multi_instance(100, 5, 1, seed=3)),
+        ('multiple_20_1_2', generate_multi_instance(20, 1, 2, seed=4)),
+        ('multiple_30_1_3', generate_multi_instance(30, 1, 3, seed=5)),
+        ('multiple_60_2_4', generate_multi_instance(60, 2, 4, seed=6))
+    ]
+
+    result_list = []
+    for instance_name, input_data in instance_list:
+        values, weights, capacities = load_multi_input_data(input_data)
+
+        start_time = time.time()
+        greedy_dict = surrogate_greedy_multi(values, weights, capacities)
+        greedy_time = time.time() - start_time
+
+        start_time = time.time()
+        branch_and_bound_dict = branch_and_bound_multi(values, weights, capacities, max_time=max_time)
+        branch_and_bound_time = time.time() - start_time
+
+        result_list.append({
+            'instance_name': instance_name,
+            'greedy_value': greedy_dict['total_value'],
+            'greedy_time': greedy_time,
+            'branch_and_bound_value': branch_and_bound_dict['total_value'],
+            'branch_and_bound_time': branch_and_bound_time,
+            'is_provably_optimal': branch_and_bound_dict['is_provably_optimal']
+        })
+
+    return result_list
+
+
+if __name__ == '__main__':
+    print(benchmark_reachable_weights())
+    for result_dict in benchmark_dynamic_programming_kernels():
+        print(result_dict)
+    for result_dict in benchmark_multi_knapsack():
+        print(result_dict)
@@ -0,0 +1,83 @@
+import numpy as np
+
+
+def dantzig_bound_suffix(prefix_values, prefix_weights, sorted_values, sorted_weights, first_item,
+                         capacity_array):
+    """
+    Vectorized fractional (Dantzig) bound on the value that items first_item onwards, in value density
+    order, can add to each capacity in capacity_array.
+    """
+
+    num_items = sorted_values.shape[0]
+
+    target_array = prefix_weights[first_item] + capacity_array
+    break_array = np.searchsorted(prefix_weights, target_array, side='right') - 1
+    bound_array = prefix_values[break_array] - prefix_values[first_item]
+
+    # add the fractional part of the break item, where there is one
+    has_break = break_array < num_items
+    break_items = break_array[has_break]
+    bound_array[has_break] += (target_array[has_break] - prefix_weights[break_items]) * \
+        sorted_values[break_items] // sorted_weights[break_items]
+
+    return bound_array
+
+
+def dantzig_bound(sorted_values, sorted_weights, capacity):
+    """
+    Return the fractional (Dantzig) upper bound, with the items sorted by value density descending.
+    """
+
+    num_items = sorted_values.shape[0]
+    remaining_capacity = capacity
+    bound = 0
+
+    for item_index in range(num_items):
+        value, weight = int(sorted_values[item_index]), int(sorted_weights[item_index])
+        if weight > remaining_capacity:
+            # take the fitting fraction of the break item, rounded down as the optimum is an integer
+            return bound + remaining_capacity * value // weight
+        bound += value
+        remaining_capacity -= weight
+
+    return bound
+
+
+def martello_toth_bound(sorted_values, sorted_weights, capacity):
+    """
+    Return the Martello-Toth (U2) upper bound, with the items sorted by value density descending. It branches
+    on the break item: either leave it out and fill with a fraction of the next item, or put it in and free
+    its overflow with a fraction of the previous item. It is never weaker than the Dantzig bound.
+    """
+
+    num_items = sorted_values.shape[0]
+
+    # find the break item, the first one that doesn't fit whole
+    break_index = 0
+    remaining_capacity = capacity
+    break_value = 0
+    while break_index < num_items and int(sorted_weights[break_index]) <= remaining_capacity:
+        remaining_capacity -= int(sorted_weights[break_index])
+        break_value += int(sorted_values[break_index])
+        break_index += 1
+
+    # everything fits
+    if break_index == num_items:
+        return break_value
+
+    # break item out, the rest of the capacity filled with the next item
+    if break_index + 1 < num_items:
+        bound_without_break = break_value + \
+            remaining_capacity * int(sorted_values[break_index + 1]) // int(sorted_weights[break_index + 1])
+    else:
+        bound_without_break = break_value
+
+    # break item in, its overflow freed by removing part of the previous item (rounded up)
+    overflow = int(sorted_weights[break_index]) - remaining_capacity
+    if break_index > 0:
+        bound_with_break = break_value + int(sorted_values[break_index]) - \
+            -(-overflow * int(sorted_values[break_index - 1]) // int(sorted_weights[break_index - 1]))
+    else:
+        bound_with_break = bound_without_break
+
+    return max(bound_without_break, bound_with_break)
@@ -1,5 +1,12 @@
+import time
+from fractions import Fraction
+from functools import reduce
+from math import gcd
+
 import numpy as np
 
+from assignment_2.subset_sum_functions import get_largest_reachable_weight
+
 
 def load_input_data(input_data):
     """
@@ -13,16 +20,154 @@ def load_input_data(input_data):
     item_count = int(firstLine[0])
     capacity = int(firstLine[1])
 
-    out_array = np.zeros((item_count, 2))
-
-    for i in range(item_count):
-        line = lines[i + 1]
-        parts = line.split()
-        out_array[i] = np.array([int(parts[0]), int(parts[1])])
+    # parsed as integers, as float64 isn't exact above 2 ** 53
+    out_array = np.array([[int(part) for part in lines[i + 1].split()[:2]] for i in range(item_count)],
+                         dtype=np.int64).reshape(item_count, 2)
 
     return out_array, capacity
 
 
+def get_density_order(values, weights):
+    """
+    Return item indexes sorted by value density descending, with ties broken by value. Small enough items are
+    ordered with float densities, which can't tie or swap two different ratios below 2 ** 26, and larger ones
+    with exact fractions.
+    """
+
+    if values.shape[0] == 0 or max(int(values.max()), int(weights.max())) < 2 ** 26:
+        return np.lexsort((-values, -(values / weights)))
+
+    value_list, weight_list = values.tolist(), weights.tolist()
+    return np.array(sorted(range(len(value_list)),
+                           key=lambda index: (-Fraction(value_list[index], weight_list[index]), -value_list[index])),
+                    dtype=np.int64)
+
+
+class KnapsackInstance:
+    """
+    A knapsack instance with the values and weights as contiguous int64 arrays, plus the value density order,
+    the sorted items' prefix sums and the totals that the solvers share. Totals are python ints, and the
+    prefix sums fall back to python int (object) arrays if the totals don't fit in an int64, so sums are
+    always exact.
+    """
+
+    __slots__ = ('values', 'weights', 'capacity', 'num_items', 'order_array', 'sorted_values', 'sorted_weights',
+                 'prefix_values', 'prefix_weights', 'total_value', 'total_weight')
+
+    def __init__(self, values, weights, capacity):
+        self.values = np.ascontiguousarray(values, dtype=np.int64)
+        self.weights = np.ascontiguousarray(weights, dtype=np.int64)
+        self.capacity = int(capacity)
+        self.num_items = self.values.shape[0]
+
+        self.order_array = get_density_order(self.values, self.weights)
+        self.sorted_values = self.values[self.order_array]
+        self.sorted_weights = self.weights[self.order_array]
+
+        self.total_value = sum(self.values.tolist())
+        self.total_weight = sum(self.weights.tolist())
+        int64_max = np.iinfo(np.int64).max
+        prefix_dtype = np.int64 if max(self.total_value, self.total_weight) <= int64_max else object
+        self.prefix_values = np.zeros(self.num_items + 1, dtype=prefix_dtype)
+        self.prefix_weights = np.zeros(self.num_items + 1, dtype=prefix_dtype)
+        np.cumsum(self.sorted_values.astype(prefix_dtype), out=self.prefix_values[1:])
+        np.cumsum(self.sorted_weights.astype(prefix_dtype), out=self.prefix_weights[1:])
+
+    @classmethod
+    def from_array(cls, input_array, capacity):
+        """
+        Build an instance from a [value, weight] array.
+        """
+
+        return cls(input_array[:, 0], input_array[:, 1], capacity)
+
+    def __len__(self):
+        return self.num_items
+
+    @property
+    def shape(self):
+        return self.num_items, 2
+
+    def subset(self, item_indexes, capacity=None):
+        """
+        Return a new instance of the items at item_indexes (an index array, mask or slice), with the same
+        capacity unless another one is given.
+        """
+
+        return KnapsackInstance(self.values[item_indexes], self.weights[item_indexes],
+                                self.capacity if capacity is None else capacity)
+
+    def with_capacity(self, capacity):
+        """
+        Return a copy of the instance with another capacity. The arrays, order and prefix sums don't depend on
+        the capacity, so they are shared rather than recomputed.
+        """
+
+        instance = KnapsackInstance.__new__(KnapsackInstance)
+        for slot_name in self.__slots__:
+            setattr(instance, slot_name, getattr(self, slot_name))
+        instance.capacity = int(capacity)
+
+        return instance
+
+    def get_totals(self, solution_array):
+        """
+        Return the exact (total value, total weight) of the items taken in a 0-1 solution array.
+        """
+
+        is_taken_array = np.asarray(solution_array).astype(bool)
+
+        return sum(self.values[is_taken_array].tolist()), sum(self.weights[is_taken_array].tolist())
+
+    def to_array(self):
+        """
+        Return the items as an int64 [value, weight] array.
+        """
+
+        return np.column_stack((self.values, self.weights))
+
+
+def get_knapsack_instance(input_array, capacity):
+    """
+    Return input_array unchanged if it is already a KnapsackInstance with this capacity, otherwise build one
+    from the [value, weight] array.
+    """
+
+    if isinstance(input_array, KnapsackInstance):
+        if input_array.capacity == capacity:
+            return input_array
+        return input_array.with_capacity(capacity)
+
+    return KnapsackInstance.from_array(input_array, capacity)
+
+
+def load_multi_input_data(input_data):
+    """
+    Return input data as (values, weights, capacities) for m constraints and k knapsacks, with weights an
+    (n, m) array and capacities a (k, m) array. A first line of "n capacity" is the standard format with
+    m = k = 1. Otherwise the first line is "n m k", followed by k lines of m capacities and n lines of
+    "value weight_1 ... weight_m".
+    """
+
+    lines = input_data.strip().split('\n')
+
+    first_line = [int(part) for part in lines[0].split()]
+    if len(first_line) == 2:
+        item_count, num_constraints, num_knapsacks = first_line[0], 1, 1
+        capacities = np.array([[first_line[1]]], dtype=np.int64)
+        item_lines = lines[1:item_count + 1]
+    else:
+        item_count, num_constraints, num_knapsacks = first_line
+        capacities = np.array([[int(part) for part in lines[1 + knapsack_index].split()]
+                               for knapsack_index in range(num_knapsacks)], dtype=np.int64)
+        item_lines = lines[1 + num_knapsacks:1 + num_knapsacks + item_count]
+
+    item_array = np.array([[int(part) for part in line.split()] for line in item_lines],
+                          dtype=np.int64).reshape(item_count, num_constraints + 1)
+
+    return item_array[:, 0], item_array[:, 1:], capacities
+
+
 def prepare_output_data(solution_dict, is_provably_optimal=False):
     """
     Return output in specified format.
@@ -39,3 +184,58 @@ def prepare_output_data(solution_dict, is_provably_optimal=False):
     return output_data
 
 
+def preprocess_input_data(input_array, capacity, max_time=None, max_capacity_bits=2 ** 27,
+                          max_bit_operations=2 ** 36):
+    """
+    Drop items heavier than the capacity, divide the weights and capacity by the weights' GCD and tighten
+    the capacity to the largest reachable total weight. Returns the reduced KnapsackInstance and capacity with
+    a dict that restore_solution uses to map solutions back to the original items.
+    The tightening's bitset has a bit per unit of capacity, so it is skipped when the capacity has more than
+    max_capacity_bits bits or the items times capacity is over max_bit_operations, and it gives up after
+    max_time seconds.
+    """
+
+    start_time = time.time()
+
+    instance = get_knapsack_instance(input_array, capacity)
+
+    kept_item_array = np.nonzero(instance.weights <= capacity)[0]
+
+    weight_list = instance.weights[kept_item_array].tolist()
+    weight_gcd = reduce(gcd, weight_list, 0) or 1
+    weight_list = [weight // weight_gcd for weight in weight_list]
+    reduced_capacity = capacity // weight_gcd
+
+    is_tightening_affordable = reduced_capacity <= max_capacity_bits and \
+        len(weight_list) * reduced_capacity <= max_bit_operations
+    if sum(weight_list) > reduced_capacity and is_tightening_affordable:
+        deadline = None if max_time is None else start_time + max_time
+        reduced_capacity = get_largest_reachable_weight(weight_list, reduced_capacity, deadline=deadline)
+
+    reduced_instance = KnapsackInstance(instance.values[kept_item_array], np.array(weight_list, dtype=np.int64),
+                                        reduced_capacity)
+
+    preprocess_dict = {
+        'num_items': instance.num_items,
+        'kept_item_array': kept_item_array,
+        'weight_gcd': weight_gcd,
+        'capacity': capacity,
+        'reduced_capacity': reduced_capacity
+    }
+
+    return reduced_instance, reduced_capacity, preprocess_dict
+
+
+def restore_solution(solution_dict, preprocess_dict):
+    """
+    Map a solution of the preprocessed problem back to the original item indexing and weights.
+    """
+
+    solution_array = np.zeros(preprocess_dict['num_items'], dtype=int)
+    solution_array[preprocess_dict['kept_item_array']] = solution_dict['solution_array']
+
+    restored_dict = dict(solution_dict)
+    restored_dict['solution_array'] = solution_array
+    restored_dict['total_weight'] = solution_dict['total_weight'] * preprocess_dict['weight_gcd']
+
+    return restored_dict
@@ -0,0 +1,48 @@
+import numpy as np
+
+# numba is optional, without it the dynamic programming falls back to the numpy version
+try:
+    from numba import njit
+except ImportError:
+    njit = None
+
+NUMBA_AVAILABLE = njit is not None
+
+
+def dynamic_programming_kernel(values, weights, capacity, value_array, decision_array):
+    """
+    Fill value_array with the best value for each capacity, setting bit c of decision_array[i] when item i is
+    taken at capacity c.
+    """
+
+    for item_index in range(values.shape[0]):
+        weight = weights[item_index]
+        value = values[item_index]
+        if weight > capacity:
+            continue
+        # go down through the capacities so each item is only used once
+        for column in range(capacity, weight - 1, -1):
+            take_value = value_array[column - weight] + value
+            if take_value > value_array[column]:
+                value_array[column] = take_value
+                decision_array[item_index, column >> 3] |= np.uint8(1 << (column & 7))
+
+
+def backtrack_kernel(weights, capacity, decision_array, solution_array):
+    """
+    Walk back through decision_array from full capacity, marking the taken items in solution_array. Returns the
+    total weight.
+    """
+
+    remaining_capacity = capacity
+    for item_index in range(weights.shape[0] - 1, -1, -1):
+        if (decision_array[item_index, remaining_capacity >> 3] >> (remaining_capacity & 7)) & 1:
+            solution_array[item_index] = 1
+            remaining_capacity -= weights[item_index]
+
+    return capacity - remaining_capacity
+
+
+if NUMBA_AVAILABLE:
+    dynamic_programming_kernel = njit(cache=True)(dynamic_programming_kernel)
+    backtrack_kernel = njit(cache=True)(backtrack_kernel)
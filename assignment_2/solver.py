@@ -1,10 +1,19 @@
 #!/usr/bin/python
 # -*- coding: utf-8 -*-
+import os
+import time
 from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor, as_completed
 Item = namedtuple("Item", ['index', 'value','weight'])
 
-from assignment_2.data_processing_functions import load_input_data, prepare_output_data
-from assignment_2.solving_functions import value_per_weight_greedy, dynamic_programming
+from assignment_2.data_processing_functions import load_input_data, prepare_output_data, preprocess_input_data, \
+    restore_solution, load_multi_input_data
+from assignment_2.solving_functions import value_per_weight_greedy, dynamic_programming_bottom_up, \
+    dynamic_programming_linear_memory, branch_and_bound, pareto_dynamic_programming, \
+    core_problem_reduction, portfolio_solve, branch_and_bound_multi, PORTFOLIO_METHOD_NAMES
+
+# wall-clock budget shared by the methods in the portfolio
+PORTFOLIO_TIME_LIMIT = 60
 
 
 def solve_it_trivial(input_data):
@@ -51,27 +60,183 @@ def solve_it_greedy_value_per_weight(input_array, capacity):
 
 def solve_it_dynamic_programming(input_array, capacity):
 
-    solution_dict = dynamic_programming(input_array, capacity)
+    solution_dict = dynamic_programming_bottom_up(input_array, capacity)
 
     return solution_dict
 
 
-def solve_it(input_data):
+def solve_it_dynamic_programming_linear_memory(input_array, capacity):
 
-    input_array, capacity = load_input_data(input_data)
+    solution_dict = dynamic_programming_linear_memory(input_array, capacity)
 
-    if input_array.shape[0] <= 200:
-        solution_dict = solve_it_dynamic_programming(input_array, capacity)
-        output_data = prepare_output_data(solution_dict, is_provably_optimal=True)
-    else:
-        solution_dict = solve_it_greedy_value_per_weight(input_array, capacity)
-        output_data = prepare_output_data(solution_dict, is_provably_optimal=False)
+    return solution_dict
+
+
+def solve_it_branch_and_bound(input_array, capacity, max_nodes=10 ** 6, max_time=10):
+
+    solution_dict = branch_and_bound(input_array, capacity, max_nodes=max_nodes, max_time=max_time)
+
+    return solution_dict
+
+
+def solve_it_pareto_dynamic_programming(input_array, capacity):
+
+    solution_dict = pareto_dynamic_programming(input_array, capacity)
+
+    return solution_dict
+
+
+def solve_it_core_problem(input_array, capacity):
+
+    solution_dict = core_problem_reduction(input_array, capacity, core_solver=pareto_dynamic_programming)
+
+    return solution_dict
+
+
+def solve_it_portfolio(input_array, capacity, time_limit=PORTFOLIO_TIME_LIMIT):
+
+    solution_dict = portfolio_solve(input_array, capacity, time_limit=time_limit)
+
+    return solution_dict
+
+
+def solve_it(input_data, time_limit=PORTFOLIO_TIME_LIMIT):
+
+    start_time = time.time()
+
+    original_input_array, original_capacity = load_input_data(input_data)
+
+    # scale and tighten the problem, then map the solution back at the end. the time this takes comes out
+    # of the portfolio's time limit
+    input_array, capacity, preprocess_dict = preprocess_input_data(original_input_array, original_capacity,
+                                                                   max_time=0.1 * time_limit)
+
+    # greedy, branch and bound and dynamic programming race each other, keeping the best answer found
+    solution_dict = solve_it_portfolio(input_array, capacity,
+                                       time_limit=max(time_limit - (time.time() - start_time), 0))
+
+    solution_dict = restore_solution(solution_dict, preprocess_dict)
+    output_data = prepare_output_data(solution_dict,
+                                      is_provably_optimal=solution_dict['is_provably_optimal'])
 
     #print(solution_dict)
 
     return output_data
 
 
+def solve_it_multi(input_data, time_limit=PORTFOLIO_TIME_LIMIT):
+    """
+    Solve an instance with m constraints and k knapsacks. The standard single constraint, single knapsack
+    format goes to solve_it. In the output, each item gets 0 if left out or j + 1 for knapsack j.
+    """
+
+    values, weights, capacities = load_multi_input_data(input_data)
+
+    if capacities.shape == (1, 1):
+        return solve_it(input_data, time_limit=time_limit)
+
+    solution_dict = branch_and_bound_multi(values, weights, capacities, max_nodes=float('inf'),
+                                           max_time=time_limit)
+    output_data = prepare_output_data(solution_dict, is_provably_optimal=solution_dict['is_provably_optimal'])
+
+    return output_data
+
+
+def load_batch_inputs(inputs):
+    """
+    Return a list of (name, input data) from instance strings, file paths and directories of files.
+    """
+
+    named_inputs = []
+    for input_index, input_item in enumerate(inputs):
+        if os.path.isdir(input_item):
+            for file_name in sorted(os.listdir(input_item)):
+                file_location = os.path.join(input_item, file_name)
+                if os.path.isfile(file_location):
+                    with open(file_location, 'r') as input_data_file:
+                        named_inputs.append((file_location, input_data_file.read()))
+        elif os.path.isfile(input_item):
+            with open(input_item, 'r') as input_data_file:
+                named_inputs.append((input_item, input_data_file.read()))
+        else:
+            named_inputs.append((str(input_index), input_item))
+
+    return named_inputs
+
+
+def get_batch_sort_key(named_input):
+    # item count then capacity, malformed inputs sort last and fail in their own worker
+    try:
+        return tuple(int(part) for part in named_input[1].split(None, 2)[:2])
+    except ValueError:
+        return (-1, -1)
+
+
+def solve_it_timed(input_data, time_limit):
+    start_time = time.time()
+    output_data = solve_it(input_data, time_limit=time_limit)
+
+    return output_data, time.time() - start_time
+
+
+def solve_batch_iter(inputs, max_workers=None, time_limit=PORTFOLIO_TIME_LIMIT):
+    """
+    Solve many instances (strings, file paths or directories) across a process pool, largest first, and
+    yield a result dict for each as it finishes. time_limit is each instance's deadline, after which it
+    returns the best solution found. An instance that fails is reported with its error in its result dict,
+    with no output_data, and the other instances carry on. By default there is one worker per portfolio's
+    worth of cores, as each instance's portfolio starts a process per method and the deadlines are wall-clock.
+    """
+
+    if max_workers is None:
+        max_workers = max(1, (os.cpu_count() or 1) // len(PORTFOLIO_METHOD_NAMES))
+
+    named_inputs = load_batch_inputs(inputs)
+
+    # schedule by item count then capacity, largest first, so the long jobs don't start last
+    named_inputs.sort(key=get_batch_sort_key, reverse=True)
+
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        future_dict = {executor.submit(solve_it_timed, input_data, time_limit): name
+                       for name, input_data in named_inputs}
+        for future in as_completed(future_dict):
+            try:
+                output_data, solve_time = future.result()
+            except Exception as error:
+                yield {
+                    'name': future_dict[future],
+                    'output_data': None,
+                    'solve_time': None,
+                    'error': repr(error)
+                }
+                continue
+            yield {
+                'name': future_dict[future],
+                'output_data': output_data,
+                'solve_time': solve_time
+            }
+
+
+def solve_batch(inputs, max_workers=None, time_limit=PORTFOLIO_TIME_LIMIT):
+    """
+    Solve many instances with solve_batch_iter and return the results in completion order with a throughput
+    summary.
+    """
+
+    start_time = time.time()
+    result_list = list(solve_batch_iter(inputs, max_workers=max_workers, time_limit=time_limit))
+    total_time = time.time() - start_time
+
+    summary_dict = {
+        'num_instances': len(result_list),
+        'num_errors': sum('error' in result_dict for result_dict in result_list),
+        'total_time': total_time,
+        'instances_per_second': len(result_list) / total_time if total_time > 0 else float('inf')
+    }
+
+    return result_list, summary_dict
+
+
 if __name__ == '__main__':
     import sys
     if len(sys.argv) > 1:
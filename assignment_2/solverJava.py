@@ -1,27 +1,125 @@
 #!/usr/bin/python
 # -*- coding: utf-8 -*-
 
+import atexit
 import os
-from subprocess import Popen, PIPE
+import queue
+import subprocess
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
 
-def solve_it(input_data):
+SOLVER_DIRECTORY = os.path.dirname(os.path.abspath(__file__))
+
+# the shared solver process used by solve_it, started on first use
+_shared_solver = None
+_shared_solver_lock = threading.Lock()
+
+
+def compile_java_solver():
+    """
+    Compile Solver.java if there is no up to date Solver.class next to it. javac writes into a temporary
+    directory and the class files are renamed into place, so concurrent runs never see a half written class
+    file, and at worst both compile and the last rename wins.
+    """
+
+    source_file = os.path.join(SOLVER_DIRECTORY, 'Solver.java')
+    class_file = os.path.join(SOLVER_DIRECTORY, 'Solver.class')
+
+    if os.path.exists(class_file) and os.path.getmtime(class_file) >= os.path.getmtime(source_file):
+        return
+
+    with tempfile.TemporaryDirectory(dir=SOLVER_DIRECTORY) as build_directory:
+        subprocess.run(['javac', '-d', build_directory, source_file], check=True)
+        # move any nested classes first so Solver.class is only up to date once everything it loads is
+        class_file_names = sorted(os.listdir(build_directory), key=lambda file_name: file_name == 'Solver.class')
+        for class_file_name in class_file_names:
+            os.replace(os.path.join(build_directory, class_file_name),
+                       os.path.join(SOLVER_DIRECTORY, class_file_name))
+
+
+def start_java_solver():
+    """
+    Start a Solver process in streaming mode, which solves framed instances from its stdin until it is closed.
+    """
+
+    compile_java_solver()
+
+    return subprocess.Popen(['java', 'Solver', '-stream'], cwd=SOLVER_DIRECTORY,
+                            stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True, bufsize=1)
+
+
+def stop_java_solver(process):
+    """
+    Close the Solver process's stdin so it exits, and wait for it.
+    """
+
+    process.stdin.close()
+    process.wait()
+    process.stdout.close()
 
-    # Writes the inputData to a temporay file
 
-    tmp_file_name = 'tmp.data'
-    tmp_file = open(tmp_file_name, 'w')
-    tmp_file.write(input_data)
-    tmp_file.close()
+def solve_with_java_solver(process, input_data):
+    """
+    Send one instance to a running Solver process and return its output. Each frame is a line with the
+    number of lines that follow, then those lines, in both directions.
+    """
 
-    # Runs the command: java Solver -file=tmp.data
+    input_lines = input_data.strip().split('\n')
+    process.stdin.write(str(len(input_lines)) + '\n' + '\n'.join(input_lines) + '\n')
+    process.stdin.flush()
 
-    process = Popen(['java', 'Solver', '-file=' + tmp_file_name], stdout=PIPE)
-    (stdout, stderr) = process.communicate()
+    header = process.stdout.readline()
+    if not header:
+        raise RuntimeError('Java solver exited with code ' + str(process.wait()))
 
-    # removes the temporay file
-    os.remove(tmp_file_name)
+    output_lines = [process.stdout.readline().rstrip('\n') for _ in range(int(header))]
 
-    return stdout.strip()
+    return '\n'.join(output_lines).strip()
+
+
+def solve_batch_with_java_solvers(input_data_list, num_workers=4):
+    """
+    Solve many instances across a pool of Solver processes, returning the outputs in input order. Each
+    process is only ever used by one thread at a time.
+    """
+
+    process_queue = queue.Queue()
+    processes = [start_java_solver() for _ in range(min(num_workers, len(input_data_list)))]
+    for process in processes:
+        process_queue.put(process)
+
+    def solve_with_pooled_solver(input_data):
+        process = process_queue.get()
+        try:
+            return solve_with_java_solver(process, input_data)
+        finally:
+            process_queue.put(process)
+
+    try:
+        with ThreadPoolExecutor(max_workers=len(processes) or 1) as executor:
+            output_data_list = list(executor.map(solve_with_pooled_solver, input_data_list))
+    finally:
+        for process in processes:
+            stop_java_solver(process)
+
+    return output_data_list
+
+
+@atexit.register
+def stop_shared_java_solver():
+    if _shared_solver is not None and _shared_solver.poll() is None:
+        stop_java_solver(_shared_solver)
+
+
+def solve_it(input_data):
+    global _shared_solver
+
+    # one long-lived process, with calls from different threads taking turns
+    with _shared_solver_lock:
+        if _shared_solver is None or _shared_solver.poll() is not None:
+            _shared_solver = start_java_solver()
+        return solve_with_java_solver(_shared_solver, input_data)
 
 
 import sys
@@ -31,7 +129,6 @@ if __name__ == '__main__':
         file_location = sys.argv[1].strip()
         with open(file_location, 'r') as input_data_file:
             input_data = input_data_file.read()
-        print solve_it(input_data)
+        print(solve_it(input_data))
     else:
         print('This test requires an input file.  Please select one from the data directory. (i.e. python solver.py ./data/ks_4_0)')
-
@@ -1,33 +1,44 @@
+import multiprocessing
+import queue
+import time
+from bisect import bisect_right
+from itertools import accumulate
+
 import numpy as np
 
+from assignment_2.bounding_functions import dantzig_bound_suffix, dantzig_bound, martello_toth_bound
+from assignment_2.data_processing_functions import get_knapsack_instance
+from assignment_2.jit_functions import NUMBA_AVAILABLE, dynamic_programming_kernel, backtrack_kernel
+
+# the methods portfolio_solve runs, each in its own process
+PORTFOLIO_METHOD_NAMES = ('branch_and_bound', 'expanding_core', 'core_problem', 'dynamic_programming')
+
 
 def value_per_weight_greedy(input_array, capacity):
     """
     Greedy algorithm to choose items based on first their value density, then their value.
     """
 
-    # get an array of value per weight, with a small addition based on value to prioritise
-    # high value items if the vpw is the same
-    vpw_array = input_array[:, 0] / input_array[:, 1] + input_array[:, 0] / (max(input_array[:, 0]) * 10000)
-    vpw_array_argsort = np.argsort(vpw_array)[::-1]
-    num_items = input_array.shape[0]
+    instance = get_knapsack_instance(input_array, capacity)
+    num_items = instance.num_items
+    sorted_values = instance.sorted_values.tolist()
+    sorted_weights = instance.sorted_weights.tolist()
 
     total_value = 0
     total_weight = 0
-    solution_array = np.zeros(num_items)
+    solution_array = np.zeros(num_items, dtype=np.int64)
 
     counter = 0
     while total_weight < capacity:
         if counter >= num_items:
             break
-        index = vpw_array_argsort[counter]
-        weight = input_array[index, 1]
-        value = input_array[index, 0]
-        counter += 1
+        weight = sorted_weights[counter]
+        value = sorted_values[counter]
         if total_weight + weight <= capacity:
             total_value += value
             total_weight += weight
-            solution_array[index] = 1
+            solution_array[instance.order_array[counter]] = 1
+        counter += 1
 
     out_dict = {
         'solution_array': solution_array.astype(int),
@@ -116,3 +127,1103 @@ def dynamic_programming(input_array, capacity):
     }
 
     return out_dict
+
+
+def dynamic_programming_bottom_up(input_array, capacity, use_jit=True):
+    """
+    Bottom-up dynamic programming with a rolling 1-D value array, updated once per item with np.maximum
+    over shifted slices. The take/skip decisions are kept as packed bits for backtracking. With use_jit
+    and numba installed the update and backtrack run as compiled loops instead.
+    """
+
+    instance = get_knapsack_instance(input_array, capacity)
+    values = instance.values
+    weights = instance.weights
+    num_items = instance.num_items
+
+    if use_jit and NUMBA_AVAILABLE:
+        value_array = np.zeros(capacity + 1, dtype=np.int64)
+        decision_array = np.zeros((num_items, (capacity >> 3) + 1), dtype=np.uint8)
+        dynamic_programming_kernel(values, weights, capacity, value_array, decision_array)
+        solution_array = np.zeros(num_items, dtype=np.int64)
+        total_weight = backtrack_kernel(weights, capacity, decision_array, solution_array)
+
+        out_dict = {
+            'solution_array': solution_array.astype(int),
+            'total_value': int(value_array[capacity]),
+            'total_weight': int(total_weight)
+        }
+
+        return out_dict
+
+    # use 32 bit values when they can't overflow, as the update is bound by memory bandwidth
+    value_dtype = np.int32 if instance.total_value < np.iinfo(np.int32).max else np.int64
+
+    # value_array[c] is the best value using the items seen so far with capacity c
+    value_array = np.zeros(capacity + 1, dtype=value_dtype)
+    take_buffer = np.empty(capacity + 1, dtype=value_dtype)
+    mask_buffer = np.empty(capacity + 1, dtype=bool)
+    decision_list = []
+
+    for item_index in range(num_items):
+        weight = weights[item_index]
+
+        # items heavier than the knapsack can never be taken
+        if weight > capacity:
+            decision_list.append(None)
+            continue
+
+        # taking the item at capacity c uses the previous best at capacity c - weight
+        num_columns = capacity + 1 - weight
+        take_array = take_buffer[:num_columns]
+        take_mask = mask_buffer[:num_columns]
+        np.add(value_array[:num_columns], values[item_index], out=take_array)
+        np.greater(take_array, value_array[weight:], out=take_mask)
+        decision_list.append(np.packbits(take_mask))
+        np.maximum(value_array[weight:], take_array, out=value_array[weight:])
+
+    # walk back through the decisions from full capacity
+    solution_array = np.zeros(num_items)
+    total_weight = 0
+    remaining_capacity = capacity
+    for item_index in range(num_items - 1, -1, -1):
+        packed_decisions = decision_list[item_index]
+        weight = weights[item_index]
+        if packed_decisions is None or weight > remaining_capacity:
+            continue
+        bit_index = remaining_capacity - weight
+        if (packed_decisions[bit_index >> 3] >> (7 - (bit_index & 7))) & 1:
+            solution_array[item_index] = 1
+            remaining_capacity -= weight
+            total_weight += weight
+
+    out_dict = {
+        'solution_array': solution_array.astype(int),
+        'total_value': int(value_array[capacity]),
+        'total_weight': int(total_weight)
+    }
+
+    return out_dict
+
+
+def dynamic_programming_values(input_array, capacity):
+    """
+    Return the rolling dynamic programming value array for the given items, without keeping any decisions.
+    """
+
+    instance = get_knapsack_instance(input_array, capacity)
+    values = instance.values
+    weights = instance.weights
+
+    value_dtype = np.int32 if instance.total_value < np.iinfo(np.int32).max else np.int64
+    value_array = np.zeros(capacity + 1, dtype=value_dtype)
+    take_buffer = np.empty(capacity + 1, dtype=value_dtype)
+
+    for item_index in range(instance.num_items):
+        weight = weights[item_index]
+        if weight > capacity:
+            continue
+        take_array = take_buffer[:capacity + 1 - weight]
+        np.add(value_array[:capacity + 1 - weight], values[item_index], out=take_array)
+        np.maximum(value_array[weight:], take_array, out=value_array[weight:])
+
+    return value_array
+
+
+def dynamic_programming_linear_memory_helper(instance, capacity, first_item, last_item, solution_array,
+                                            max_table_cells):
+    """
+    Hirschberg style divide and conquer - helper function. Finds how the capacity is split between the
+    two halves of the item range at the optimum, then recurses into each half.
+    """
+
+    num_items = last_item - first_item
+    if num_items == 0 or capacity == 0:
+        return
+
+    # small enough sub-problems are solved directly with the decision table
+    if num_items == 1 or num_items * (capacity + 1) <= max_table_cells:
+        sub_solution_dict = dynamic_programming_bottom_up(instance.subset(slice(first_item, last_item), capacity),
+                                                          capacity)
+        solution_array[first_item:last_item] = sub_solution_dict['solution_array']
+        return
+
+    middle_item = (first_item + last_item) // 2
+    first_value_array = dynamic_programming_values(instance.subset(slice(first_item, middle_item), capacity),
+                                                   capacity)
+    second_value_array = dynamic_programming_values(instance.subset(slice(middle_item, last_item), capacity),
+                                                    capacity)
+
+    # giving capacity c to the first half leaves capacity - c for the second half
+    split_capacity = int(np.argmax(first_value_array.astype(np.int64) + second_value_array[::-1]))
+
+    dynamic_programming_linear_memory_helper(instance, split_capacity, first_item, middle_item,
+                                            solution_array, max_table_cells)
+    dynamic_programming_linear_memory_helper(instance, capacity - split_capacity, middle_item, last_item,
+                                            solution_array, max_table_cells)
+
+
+def dynamic_programming_linear_memory(input_array, capacity, max_table_cells=2 ** 27):
+    """
+    Dynamic programming that only keeps O(capacity) values, with the chosen items rebuilt by divide and
+    conquer rather than from a stored table. Sub-problems with at most max_table_cells cells are solved
+    with the decision table.
+    """
+
+    instance = get_knapsack_instance(input_array, capacity)
+    num_items = instance.num_items
+    solution_array = np.zeros(num_items, dtype=np.int64)
+
+    dynamic_programming_linear_memory_helper(instance, capacity, 0, num_items, solution_array,
+                                            max_table_cells)
+    total_value, total_weight = instance.get_totals(solution_array)
+
+    out_dict = {
+        'solution_array': solution_array.astype(int),
+        'total_value': total_value,
+        'total_weight': total_weight
+    }
+
+    return out_dict
+
+
+def branch_and_bound(input_array, capacity, max_nodes=10 ** 7, max_time=60):
+    """
+    Depth first branch and bound over the items in value density order, pruning with the fractional
+    (Dantzig) upper bound computed from prefix sums. Stops after max_nodes nodes or max_time seconds,
+    in which case the best solution found is returned without an optimality proof.
+    """
+
+    start_time = time.time()
+
+    instance = get_knapsack_instance(input_array, capacity)
+    order_array = instance.order_array
+    num_items = instance.num_items
+
+    # python ints keep the bound arithmetic exact and are faster than numpy scalars in the search loop
+    values = instance.sorted_values.tolist()
+    weights = instance.sorted_weights.tolist()
+    prefix_values = instance.prefix_values.tolist()
+    prefix_weights = instance.prefix_weights.tolist()
+
+    def upper_bound(item_index, remaining_capacity, value):
+        # the break item is the first item in density order that no longer fits whole
+        break_index = bisect_right(prefix_weights, prefix_weights[item_index] + remaining_capacity) - 1
+        value += prefix_values[break_index] - prefix_values[item_index]
+        if break_index < num_items:
+            remaining_capacity -= prefix_weights[break_index] - prefix_weights[item_index]
+            value += remaining_capacity * values[break_index] // weights[break_index]
+        return value
+
+    # start from the greedy solution as the incumbent
+    greedy_dict = value_per_weight_greedy(instance, capacity)
+    best_value = greedy_dict['total_value']
+    best_taken = None
+
+    # each node is (next item, remaining capacity, value, taken items as a linked list of (item, parent))
+    stack = [(0, capacity, 0, None)]
+    num_nodes = 0
+    is_provably_optimal = True
+
+    while stack:
+        num_nodes += 1
+        if num_nodes > max_nodes or (num_nodes % 4096 == 0 and time.time() - start_time > max_time):
+            is_provably_optimal = False
+            break
+
+        item_index, remaining_capacity, value, taken = stack.pop()
+
+        if value > best_value:
+            best_value = value
+            best_taken = taken
+
+        if item_index == num_items or upper_bound(item_index, remaining_capacity, value) <= best_value:
+            continue
+
+        # push the skip branch first so the take branch is explored first
+        stack.append((item_index + 1, remaining_capacity, value, taken))
+        if weights[item_index] <= remaining_capacity:
+            stack.append((item_index + 1, remaining_capacity - weights[item_index], value + values[item_index],
+                          (item_index, taken)))
+
+    if best_taken is None:
+        solution_array = greedy_dict['solution_array']
+    else:
+        solution_array = np.zeros(num_items, dtype=np.int64)
+        while best_taken is not None:
+            item_index, best_taken = best_taken
+            solution_array[order_array[item_index]] = 1
+    total_value, total_weight = instance.get_totals(solution_array)
+
+    out_dict = {
+        'solution_array': solution_array.astype(int),
+        'total_value': total_value,
+        'total_weight': total_weight,
+        'is_provably_optimal': is_provably_optimal,
+        'num_nodes': min(num_nodes, max_nodes)
+    }
+
+    return out_dict
+
+
+def merge_pareto_frontier(state_weights, state_values, weight, value, capacity):
+    """
+    Add one item to a Pareto frontier sorted by weight with strictly increasing values. Returns the new
+    frontier's weights and values, with the index of each state's parent in the old frontier and whether
+    the item was taken to reach it.
+    """
+
+    num_old_states = state_weights.shape[0]
+
+    # states that can still fit the item are a prefix of the frontier
+    num_fit_states = int(np.searchsorted(state_weights, capacity - weight, side='right'))
+
+    merged_weights = np.concatenate((state_weights, state_weights[:num_fit_states] + weight))
+    merged_values = np.concatenate((state_values, state_values[:num_fit_states] + value))
+    merged_parents = np.concatenate((np.arange(num_old_states), np.arange(num_fit_states)))
+    merged_takes = np.concatenate((np.zeros(num_old_states, dtype=bool), np.ones(num_fit_states, dtype=bool)))
+
+    # sort by weight, heaviest value first on ties, then drop states not strictly better than a lighter one
+    sort_array = np.lexsort((-merged_values, merged_weights))
+    merged_values = merged_values[sort_array]
+    keep_array = np.ones(merged_values.shape[0], dtype=bool)
+    keep_array[1:] = merged_values[1:] > np.maximum.accumulate(merged_values)[:-1]
+    sort_array = sort_array[keep_array]
+
+    return merged_weights[sort_array], merged_values[keep_array], merged_parents[sort_array], \
+        merged_takes[sort_array]
+
+
+def pareto_dynamic_programming(input_array, capacity, max_states=5 * 10 ** 7):
+    """
+    Sparse (Nemhauser-Ullmann) dynamic programming that only keeps the non-dominated (weight, value) states
+    at each stage, pruned against the greedy lower bound with the Dantzig bound on the remaining items.
+    The number of states stored is reported so it can be compared with the dense table. If more than
+    max_states states are needed the greedy solution is returned without an optimality proof.
+    """
+
+    instance = get_knapsack_instance(input_array, capacity)
+    order_array = instance.order_array
+    num_items = instance.num_items
+
+    sorted_values = instance.sorted_values
+    sorted_weights = instance.sorted_weights
+    prefix_values = instance.prefix_values
+    prefix_weights = instance.prefix_weights
+
+    greedy_dict = value_per_weight_greedy(instance, capacity)
+    lower_bound = greedy_dict['total_value']
+
+    # the frontier is sorted by weight with strictly increasing values
+    state_weights = np.zeros(1, dtype=np.int64)
+    state_values = np.zeros(1, dtype=np.int64)
+    parent_list = []
+    take_list = []
+    num_states = 0
+    max_frontier_size = 1
+
+    for item_index in range(num_items):
+        weight = sorted_weights[item_index]
+        value = sorted_values[item_index]
+        merged_weights, merged_values, merged_parents, merged_takes = merge_pareto_frontier(
+            state_weights, state_values, weight, value, capacity)
+
+        # every state is a feasible solution, so it can raise the lower bound
+        lower_bound = max(lower_bound, int(merged_values.max()))
+
+        # drop states that can't reach the lower bound even with the fractional relaxation
+        bound_array = merged_values + dantzig_bound_suffix(prefix_values, prefix_weights, sorted_values,
+                                                           sorted_weights, item_index + 1,
+                                                           capacity - merged_weights)
+        keep_array = bound_array >= lower_bound
+
+        state_weights = merged_weights[keep_array]
+        state_values = merged_values[keep_array]
+        parent_list.append(merged_parents[keep_array])
+        take_list.append(merged_takes[keep_array])
+
+        num_states += state_weights.shape[0]
+        max_frontier_size = max(max_frontier_size, state_weights.shape[0])
+
+        if num_states > max_states:
+            greedy_dict.update({
+                'is_provably_optimal': False,
+                'num_states': num_states,
+                'max_frontier_size': max_frontier_size,
+                'num_dense_states': num_items * (capacity + 1)
+            })
+            return greedy_dict
+
+    # follow the parent pointers back from the best final state
+    solution_array = np.zeros(num_items, dtype=np.int64)
+    state_index = int(np.argmax(state_values))
+    for item_index in range(num_items - 1, -1, -1):
+        if take_list[item_index][state_index]:
+            solution_array[order_array[item_index]] = 1
+        state_index = parent_list[item_index][state_index]
+    total_value, total_weight = instance.get_totals(solution_array)
+
+    out_dict = {
+        'solution_array': solution_array.astype(int),
+        'total_value': total_value,
+        'total_weight': total_weight,
+        'is_provably_optimal': True,
+        'num_states': num_states,
+        'max_frontier_size': max_frontier_size,
+        'num_dense_states': num_items * (capacity + 1)
+    }
+
+    return out_dict
+
+
+def core_problem_reduction(input_array, capacity, core_solver=pareto_dynamic_programming, initial_core_size=16,
+                           measure_time_saved=False):
+    """
+    Solve the knapsack on a core of items around the break item (in value density order), plus the items the
+    reduction test (the Dantzig bound with the item flipped from its LP value) can't fix against the
+    incumbent. Items before the break outside the core are fixed in and those after it fixed out. The
+    window is doubled until the core solver proves optimality.
+    With measure_time_saved the core solver is also run on the full problem to time the saving.
+    """
+
+    start_time = time.time()
+
+    instance = get_knapsack_instance(input_array, capacity)
+    order_array = instance.order_array
+    num_items = instance.num_items
+
+    sorted_values = instance.sorted_values
+    sorted_weights = instance.sorted_weights
+    prefix_values = instance.prefix_values
+    prefix_weights = instance.prefix_weights
+
+    # incumbent to beat
+    solution_dict = value_per_weight_greedy(instance, capacity)
+    is_provably_optimal = False
+
+    break_index = int(np.searchsorted(prefix_weights, capacity, side='right')) - 1
+
+    if break_index == num_items:
+        # everything fits
+        solution_dict['solution_array'] = np.ones(num_items, dtype=int)
+        num_core_items = 0
+        is_provably_optimal = True
+    else:
+        # the LP bound with each item flipped from its LP value: items before the break forced out, so the
+        # capacity they used is freed, and items after the break forced in, so their weight is used up
+        item_indexes = np.arange(num_items)
+        is_before_break = item_indexes < break_index
+        flip_capacity_array = np.where(is_before_break, capacity + sorted_weights, capacity - sorted_weights)
+        fits_array = flip_capacity_array >= 0
+        flip_bound_array = np.full(num_items, -1, dtype=np.int64)
+        flip_bound_array[fits_array] = dantzig_bound_suffix(prefix_values, prefix_weights, sorted_values,
+                                                            sorted_weights, 0, flip_capacity_array[fits_array])
+        flip_bound_array += np.where(is_before_break, -sorted_values, sorted_values)
+        flip_bound_array[~fits_array] = -1
+
+        core_size = initial_core_size
+        while True:
+            # the core is a window around the break item plus any item the reduction test can't fix
+            window_start = max(0, break_index - core_size)
+            window_end = min(num_items, break_index + core_size + 1)
+            is_core_array = flip_bound_array > solution_dict['total_value']
+            is_core_array[window_start:window_end] = True
+            num_core_items = int(is_core_array.sum())
+
+            # items before the break outside the core are taken, so the core gets what is left of the capacity
+            is_fixed_in_array = is_before_break & ~is_core_array
+            core_capacity = capacity - int(sorted_weights[is_fixed_in_array].sum())
+            core_items = order_array[is_core_array]
+            core_solution_dict = core_solver(instance.subset(core_items, core_capacity), core_capacity)
+            core_value = int(sorted_values[is_fixed_in_array].sum()) + core_solution_dict['total_value']
+
+            if core_value > solution_dict['total_value']:
+                solution_array = np.zeros(num_items, dtype=np.int64)
+                solution_array[order_array[is_fixed_in_array]] = 1
+                solution_array[core_items] = core_solution_dict['solution_array']
+                total_value, total_weight = instance.get_totals(solution_array)
+                solution_dict = {
+                    'solution_array': solution_array.astype(int),
+                    'total_value': total_value,
+                    'total_weight': total_weight
+                }
+
+            # the items outside the core can't beat the incumbent when flipped, so an exact core is optimal
+            if core_solution_dict['is_provably_optimal']:
+                is_provably_optimal = True
+                break
+            if num_core_items == num_items:
+                break
+            core_size *= 2
+
+    reduction_time = time.time() - start_time
+
+    solution_dict['is_provably_optimal'] = is_provably_optimal
+    solution_dict['num_fixed_items'] = num_items - num_core_items
+    solution_dict['core_size'] = num_core_items
+    solution_dict['reduction_time'] = reduction_time
+
+    if measure_time_saved:
+        full_start_time = time.time()
+        core_solver(instance, capacity)
+        solution_dict['time_saved'] = time.time() - full_start_time - reduction_time
+
+    return solution_dict
+
+
+def get_minimum_value_loss(prefix_values, prefix_weights, sorted_values, sorted_weights, end_item, excess_array):
+    """
+    Vectorized fractional lower bound on the value lost by dropping at least excess_array weight from the items
+    before end_item, in value density order, which drops the least dense items first.
+    """
+
+    target_array = prefix_weights[end_item] - excess_array
+    break_array = np.searchsorted(prefix_weights, target_array, side='right') - 1
+    loss_array = prefix_values[end_item] - prefix_values[break_array + 1]
+
+    # the part of the break item still to be dropped, rounded up as the loss is an integer
+    has_fraction = prefix_weights[break_array + 1] > target_array
+    break_items = break_array[has_fraction]
+    loss_array[has_fraction] += -(-(prefix_weights[break_items + 1] - target_array[has_fraction]) *
+                                  sorted_values[break_items] // sorted_weights[break_items])
+
+    return loss_array
+
+
+def expanding_core(input_array, capacity, max_states=2 * 10 ** 7):
+    """
+    Pisinger minknap style exact solver. Starting from the break solution (every item before the break item in
+    value density order taken), items are added to the core alternately from the out side, where taking them
+    is the change, and from the in side, where dropping them is. Non-dominated states are kept even when
+    they are over capacity, and pruned with fractional bounds from the remaining out items (under capacity)
+    or in items (over capacity). Stops once no state is left. If more than max_states states are needed the
+    instance is handed to pareto_dynamic_programming, keeping the better of the two solutions.
+    """
+
+    instance = get_knapsack_instance(input_array, capacity)
+    order_array = instance.order_array
+    num_items = instance.num_items
+
+    sorted_values = instance.sorted_values
+    sorted_weights = instance.sorted_weights
+    prefix_values = instance.prefix_values
+    prefix_weights = instance.prefix_weights
+    break_index = int(np.searchsorted(prefix_weights, capacity, side='right')) - 1
+
+    greedy_dict = value_per_weight_greedy(instance, capacity)
+    lower_bound = greedy_dict['total_value']
+    best_stage, best_state = None, None
+
+    # the core is sorted items first_in to last_out - 1, before it items are in and after it out
+    first_in, last_out = break_index, break_index
+    state_weights = np.array([prefix_weights[break_index]], dtype=np.int64)
+    state_values = np.array([prefix_values[break_index]], dtype=np.int64)
+    if state_weights[0] <= capacity and state_values[0] > lower_bound:
+        lower_bound, best_stage, best_state = int(state_values[0]), 0, 0
+
+    # one (sorted item, parents, flips) per stage
+    stage_list = []
+    num_states = 1
+    no_state_limit = np.iinfo(np.int64).max // 4
+
+    while state_weights.shape[0] > 0 and (first_in > 0 or last_out < num_items):
+        # alternate between the two sides of the core while both have items left
+        if last_out < num_items and (first_in == 0 or len(stage_list) % 2 == 0):
+            item_index = last_out
+            last_out += 1
+            weight, value = sorted_weights[item_index], sorted_values[item_index]
+        else:
+            first_in -= 1
+            item_index = first_in
+            weight, value = -sorted_weights[item_index], -sorted_values[item_index]
+
+        state_weights, state_values, parent_array, flip_array = merge_pareto_frontier(
+            state_weights, state_values, weight, value, no_state_limit)
+
+        # new best feasible state
+        is_feasible_array = state_weights <= capacity
+        if is_feasible_array.any():
+            feasible_index = int(np.argmax(np.where(is_feasible_array, state_values, -1)))
+            if state_values[feasible_index] > lower_bound:
+                lower_bound = int(state_values[feasible_index])
+                best_stage, best_state = len(stage_list) + 1, feasible_index
+
+        # under capacity states can at best be filled up fractionally with the remaining out items, over
+        # capacity ones must at least fractionally give up the least dense remaining in items
+        bound_array = np.full(state_weights.shape[0], -1, dtype=np.int64)
+        bound_array[is_feasible_array] = state_values[is_feasible_array] + dantzig_bound_suffix(
+            prefix_values, prefix_weights, sorted_values, sorted_weights, last_out,
+            capacity - state_weights[is_feasible_array])
+        is_recoverable_array = ~is_feasible_array & (state_weights - prefix_weights[first_in] <= capacity)
+        if is_recoverable_array.any():
+            bound_array[is_recoverable_array] = state_values[is_recoverable_array] - get_minimum_value_loss(
+                prefix_values, prefix_weights, sorted_values, sorted_weights, first_in,
+                state_weights[is_recoverable_array] - capacity)
+
+        # keep the best state's index pointing at the same state after pruning
+        keep_array = bound_array > lower_bound
+        if best_stage == len(stage_list) + 1:
+            keep_array[best_state] = True
+            best_state = int(keep_array[:best_state].sum())
+
+        state_weights, state_values = state_weights[keep_array], state_values[keep_array]
+        stage_list.append((item_index, parent_array[keep_array], flip_array[keep_array]))
+
+        num_states += state_weights.shape[0]
+        if num_states > max_states:
+            break
+
+    is_provably_optimal = num_states <= max_states
+
+    if best_stage is None:
+        solution_dict = greedy_dict
+    else:
+        # start from the break solution and apply the flips from the best stage back to the start
+        sorted_solution_array = np.zeros(num_items)
+        sorted_solution_array[:break_index] = 1
+        state_index = best_state
+        for stage_index in range(best_stage - 1, -1, -1):
+            item_index, parent_array, flip_array = stage_list[stage_index]
+            if flip_array[state_index]:
+                sorted_solution_array[item_index] = 1 - sorted_solution_array[item_index]
+            state_index = parent_array[state_index]
+
+        solution_array = np.zeros(num_items, dtype=np.int64)
+        solution_array[order_array] = sorted_solution_array
+        total_value, total_weight = instance.get_totals(solution_array)
+        solution_dict = {
+            'solution_array': solution_array.astype(int),
+            'total_value': total_value,
+            'total_weight': total_weight
+        }
+
+    solution_dict['is_provably_optimal'] = is_provably_optimal
+    solution_dict['num_states'] = num_states
+    solution_dict['core_size'] = last_out - first_in
+
+    if not is_provably_optimal:
+        pareto_solution_dict = pareto_dynamic_programming(instance, capacity, max_states=max_states)
+        if pareto_solution_dict['is_provably_optimal'] or \
+                pareto_solution_dict['total_value'] > solution_dict['total_value']:
+            pareto_solution_dict['num_states'] += num_states
+            pareto_solution_dict['core_size'] = last_out - first_in
+            solution_dict = pareto_solution_dict
+
+    return solution_dict
+
+
+def get_surrogate_weights(weights, capacities, multipliers):
+    """
+    Combine the m constraints into one surrogate weight per item, with each constraint scaled by its total
+    capacity over the knapsacks. The surrogate capacity is then multipliers.sum().
+    """
+
+    return weights @ (multipliers / capacities.sum(axis=0))
+
+
+def surrogate_greedy_multi(values, weights, capacities, num_rounds=10):
+    """
+    Greedy for m constraints and k knapsacks. Items are sorted by value per surrogate weight and put in the
+    first knapsack they fit in. Over num_rounds rounds the surrogate multipliers of the constraints that
+    fill up most are raised. solution_array holds 0 for items left out and j + 1 for knapsack j.
+    """
+
+    num_items = values.shape[0]
+    total_capacities = capacities.sum(axis=0)
+
+    # start with each constraint weighted by how oversubscribed it is
+    multipliers = np.maximum(weights.sum(axis=0) / total_capacities, 1e-9)
+    out_dict = None
+
+    for _ in range(num_rounds):
+        surrogate_weights = get_surrogate_weights(weights, capacities, multipliers)
+        order_array = np.argsort(-values / np.maximum(surrogate_weights, 1e-12), kind='stable')
+
+        remaining_capacities = capacities.copy()
+        solution_array = np.zeros(num_items, dtype=int)
+        for item_index in order_array:
+            fits_array = (remaining_capacities >= weights[item_index]).all(axis=1)
+            if fits_array.any():
+                knapsack_index = int(np.argmax(fits_array))
+                remaining_capacities[knapsack_index] -= weights[item_index]
+                solution_array[item_index] = knapsack_index + 1
+
+        total_value = int(values[solution_array > 0].sum())
+        if out_dict is None or total_value > out_dict['total_value']:
+            out_dict = {
+                'solution_array': solution_array,
+                'total_value': total_value,
+                'total_weight': (capacities - remaining_capacities).tolist(),
+                'multipliers': multipliers.copy()
+            }
+
+        # the constraints that are closest to full get more weight next round
+        usage_array = 1 - remaining_capacities.sum(axis=0) / total_capacities
+        multipliers = multipliers * np.exp(usage_array - usage_array.mean())
+
+    return out_dict
+
+
+def branch_and_bound_multi(values, weights, capacities, max_nodes=10 ** 6, max_time=60):
+    """
+    Depth first branch and bound for m constraints and k knapsacks, branching on which knapsack (if any) each
+    item goes in, in surrogate density order. Nodes are pruned with the Dantzig bound of the surrogate
+    relaxation, using the multipliers of the surrogate greedy, which also gives the starting incumbent.
+    Knapsacks with the same remaining capacities are only tried once.
+    """
+
+    start_time = time.time()
+
+    greedy_dict = surrogate_greedy_multi(values, weights, capacities)
+    multipliers = greedy_dict['multipliers']
+    total_capacities = capacities.sum(axis=0)
+    num_items = values.shape[0]
+
+    surrogate_weights = np.maximum(get_surrogate_weights(weights, capacities, multipliers), 1e-12)
+    order_array = np.argsort(-values / surrogate_weights, kind='stable')
+    sorted_values = [int(value) for value in values[order_array]]
+    sorted_surrogate_weights = [float(weight) for weight in surrogate_weights[order_array]]
+    prefix_values = [0] + list(accumulate(sorted_values))
+    prefix_surrogate_weights = [0.0] + list(accumulate(sorted_surrogate_weights))
+    surrogate_scale = multipliers / total_capacities
+
+    def upper_bound(item_position, remaining_capacities, value):
+        remaining_surrogate = float((remaining_capacities @ surrogate_scale).sum())
+        target = prefix_surrogate_weights[item_position] + remaining_surrogate
+        break_position = bisect_right(prefix_surrogate_weights, target + 1e-9) - 1
+        value += prefix_values[break_position] - prefix_values[item_position]
+        if break_position < num_items:
+            value += (target - prefix_surrogate_weights[break_position]) * sorted_values[break_position] / \
+                sorted_surrogate_weights[break_position]
+        return int(np.floor(value + 1e-9))
+
+    best_value = greedy_dict['total_value']
+    best_assignment = None
+
+    # each node is (next item position, remaining capacities, value, assignment linked list)
+    stack = [(0, capacities.copy(), 0, None)]
+    num_nodes = 0
+    is_provably_optimal = True
+
+    while stack:
+        num_nodes += 1
+        if num_nodes > max_nodes or (num_nodes % 1024 == 0 and time.time() - start_time > max_time):
+            is_provably_optimal = False
+            break
+
+        item_position, remaining_capacities, value, assignment = stack.pop()
+
+        if value > best_value:
+            best_value = value
+            best_assignment = assignment
+
+        if item_position == num_items or upper_bound(item_position, remaining_capacities, value) <= best_value:
+            continue
+
+        item_index = order_array[item_position]
+        stack.append((item_position + 1, remaining_capacities, value, assignment))
+
+        # put the item in each knapsack it fits in, pushed in reverse so the first knapsack is explored first
+        fits_array = (remaining_capacities >= weights[item_index]).all(axis=1)
+        tried_capacities = set()
+        child_list = []
+        for knapsack_index in np.nonzero(fits_array)[0]:
+            capacity_key = tuple(remaining_capacities[knapsack_index])
+            if capacity_key in tried_capacities:
+                continue
+            tried_capacities.add(capacity_key)
+            child_capacities = remaining_capacities.copy()
+            child_capacities[knapsack_index] -= weights[item_index]
+            child_list.append((item_position + 1, child_capacities, value + int(values[item_index]),
+                               ((item_index, int(knapsack_index)), assignment)))
+        stack.extend(child_list[::-1])
+
+    if best_assignment is None:
+        solution_array = greedy_dict['solution_array']
+    else:
+        solution_array = np.zeros(num_items, dtype=int)
+        while best_assignment is not None:
+            (item_index, knapsack_index), best_assignment = best_assignment
+            solution_array[item_index] = knapsack_index + 1
+
+    knapsack_weights = np.zeros(capacities.shape, dtype=np.int64)
+    for knapsack_index in range(capacities.shape[0]):
+        knapsack_weights[knapsack_index] = weights[solution_array == knapsack_index + 1].sum(axis=0)
+
+    out_dict = {
+        'solution_array': solution_array,
+        'total_value': int(values[solution_array > 0].sum()),
+        'total_weight': knapsack_weights.tolist(),
+        'is_provably_optimal': is_provably_optimal,
+        'num_nodes': min(num_nodes, max_nodes)
+    }
+
+    return out_dict
+
+
+def run_portfolio_method(method_name, input_array, capacity, max_time, result_queue):
+    """
+    Run one portfolio method and put (method name, solution dict) on the result queue - worker function.
+    """
+
+    if method_name == 'branch_and_bound':
+        solution_dict = branch_and_bound(input_array, capacity, max_nodes=float('inf'), max_time=max_time)
+    elif method_name == 'expanding_core':
+        solution_dict = expanding_core(input_array, capacity)
+    elif method_name == 'core_problem':
+        solution_dict = core_problem_reduction(input_array, capacity, core_solver=pareto_dynamic_programming)
+    else:
+        solution_dict = dynamic_programming_linear_memory(input_array, capacity)
+        solution_dict['is_provably_optimal'] = True
+
+    result_queue.put((method_name, solution_dict))
+
+
+def portfolio_solve(input_array, capacity, time_limit=60, method_names=PORTFOLIO_METHOD_NAMES):
+    """
+    Run several methods in worker processes under one wall-clock deadline and return the best feasible
+    solution found, starting from the greedy one polished by local search. If that already meets the
+    Martello-Toth bound the workers are skipped. The solution is only marked as provably optimal if the
+    method that found it proved it, in which case the other workers are stopped straight away.
+    """
+
+    deadline = time.time() + time_limit
+
+    # built once here and pickled to every worker, so none of them re-sorts the items
+    instance = get_knapsack_instance(input_array, capacity)
+
+    # the local search comes out of the same deadline as the workers
+    solution_dict = local_search(value_per_weight_greedy(instance, capacity), instance, capacity,
+                                 max_time=min(1, 0.05 * time_limit))
+    solution_dict['method_name'] = 'local_search'
+
+    # no need for the exact methods if the heuristic solution already meets the upper bound
+    solution_dict['upper_bound'] = martello_toth_bound(instance.sorted_values, instance.sorted_weights, capacity)
+    solution_dict['is_provably_optimal'] = solution_dict['total_value'] >= solution_dict['upper_bound']
+    solution_dict['skipped_exact_search'] = solution_dict['is_provably_optimal']
+    if solution_dict['skipped_exact_search']:
+        return solution_dict
+
+    result_queue = multiprocessing.Queue()
+    processes = []
+    for method_name in method_names:
+        # branch and bound stops itself a little before the deadline so it can report its incumbent
+        process = multiprocessing.Process(target=run_portfolio_method,
+                                          args=(method_name, instance, capacity, 0.9 * time_limit,
+                                                result_queue),
+                                          daemon=True)
+        process.start()
+        processes.append(process)
+
+    num_pending = len(processes)
+    while num_pending > 0 and not solution_dict['is_provably_optimal']:
+        remaining_time = deadline - time.time()
+        if remaining_time <= 0:
+            break
+        try:
+            method_name, method_solution_dict = result_queue.get(timeout=min(remaining_time, 1))
+        except queue.Empty:
+            # a worker that died without a result won't ever report
+            if not any(process.is_alive() for process in processes):
+                break
+            continue
+        num_pending -= 1
+
+        is_better = method_solution_dict['total_value'] > solution_dict['total_value']
+        if is_better or method_solution_dict['is_provably_optimal']:
+            method_solution_dict['upper_bound'] = solution_dict['upper_bound']
+            solution_dict = method_solution_dict
+            solution_dict['method_name'] = method_name
+            solution_dict['skipped_exact_search'] = False
+
+    for process in processes:
+        if process.is_alive():
+            process.terminate()
+        process.join()
+
+    return solution_dict
+
+
+def get_best_exchange(in_values, in_weights, out_values, out_weights, slack, max_cells=10 ** 7, deadline=None):
+    """
+    Score every exchange of in-items for one out-item at once by broadcasting, with in_values and in_weights
+    holding the value and weight of each group of in-items given up. Returns (gain, group index, out index)
+    of the best feasible exchange, processing the out-items in chunks of at most max_cells cells. Past the
+    deadline the remaining chunks are skipped and the best exchange so far is returned.
+    """
+
+    best_gain, best_group, best_out = 0, None, None
+
+    if in_values.shape[0] == 0 or out_values.shape[0] == 0:
+        return best_gain, best_group, best_out
+
+    chunk_size = max(1, max_cells // in_values.shape[0])
+    for chunk_start in range(0, out_values.shape[0], chunk_size):
+        if deadline is not None and chunk_start > 0 and time.time() > deadline:
+            break
+        chunk_values = out_values[chunk_start:chunk_start + chunk_size]
+        chunk_weights = out_weights[chunk_start:chunk_start + chunk_size]
+
+        gain_array = chunk_values[None, :] - in_values[:, None]
+        gain_array[chunk_weights[None, :] - in_weights[:, None] > slack] = 0
+        group_index, out_index = np.unravel_index(np.argmax(gain_array), gain_array.shape)
+
+        if gain_array[group_index, out_index] > best_gain:
+            best_gain = int(gain_array[group_index, out_index])
+            best_group, best_out = int(group_index), chunk_start + int(out_index)
+
+    return best_gain, best_group, best_out
+
+
+def local_search(solution_dict, input_array, capacity, max_time=1, max_pair_candidates=200):
+    """
+    Best improvement local search over add, swap (one in-item for one out-item), 2-for-1 (two in-items for
+    one out-item) and 1-for-2 moves, with each move type scored all at once using numpy broadcasting. The
+    2-for-1 moves only pair up the max_pair_candidates least dense in-items and the 1-for-2 moves the
+    max_pair_candidates densest out-items. Dropping an item on its own never helps, so drops only appear
+    inside the exchanges. Runs until no move improves or max_time seconds pass, checking the clock between
+    chunks of scoring too, and reports the gap to the Dantzig bound.
+    """
+
+    start_time = time.time()
+    deadline = start_time + max_time
+
+    instance = get_knapsack_instance(input_array, capacity)
+    values = instance.values
+    weights = instance.weights
+    vpw_array = values / weights
+    is_in_array = solution_dict['solution_array'].astype(bool)
+
+    total_value, total_weight = instance.get_totals(is_in_array)
+    num_moves = 0
+
+    while time.time() < deadline:
+        in_items = np.nonzero(is_in_array)[0]
+        out_items = np.nonzero(~is_in_array)[0]
+        slack = capacity - total_weight
+
+        # add: an empty group of in-items given up
+        best_gain, _, best_out = get_best_exchange(np.zeros(1, dtype=np.int64), np.zeros(1, dtype=np.int64),
+                                                   values[out_items], weights[out_items], slack,
+                                                   deadline=deadline)
+        best_removed = []
+
+        # swap: one in-item for one out-item
+        gain, group_index, out_index = get_best_exchange(values[in_items], weights[in_items],
+                                                         values[out_items], weights[out_items], slack,
+                                                         deadline=deadline)
+        if gain > best_gain:
+            best_gain, best_out, best_removed = gain, out_index, [in_items[group_index]]
+
+        # 2-for-1: a pair of the least dense in-items for one out-item
+        pair_in_items = in_items[np.argsort(vpw_array[in_items], kind='stable')[:max_pair_candidates]]
+        first_array, second_array = np.triu_indices(pair_in_items.shape[0], k=1)
+        gain, group_index, out_index = get_best_exchange(
+            values[pair_in_items[first_array]] + values[pair_in_items[second_array]],
+            weights[pair_in_items[first_array]] + weights[pair_in_items[second_array]],
+            values[out_items], weights[out_items], slack, deadline=deadline)
+        if gain > best_gain:
+            best_gain, best_out = gain, out_index
+            best_removed = [pair_in_items[first_array[group_index]], pair_in_items[second_array[group_index]]]
+        best_added = [out_items[best_out]] if best_out is not None else []
+
+        # 1-for-2: one in-item for a pair of the densest out-items
+        candidate_items = out_items[np.argsort(-vpw_array[out_items], kind='stable')[:max_pair_candidates]]
+        first_array, second_array = np.triu_indices(candidate_items.shape[0], k=1)
+        gain, group_index, out_index = get_best_exchange(
+            values[in_items], weights[in_items],
+            values[candidate_items[first_array]] + values[candidate_items[second_array]],
+            weights[candidate_items[first_array]] + weights[candidate_items[second_array]], slack,
+            deadline=deadline)
+        if gain > best_gain:
+            best_gain, best_removed = gain, [in_items[group_index]]
+            best_added = [candidate_items[first_array[out_index]], candidate_items[second_array[out_index]]]
+
+        if best_gain <= 0:
+            break
+
+        is_in_array[best_added] = True
+        is_in_array[best_removed] = False
+        total_value += best_gain
+        total_weight += int(weights[best_added].sum() - weights[best_removed].sum())
+        num_moves += 1
+
+    # compare against the LP relaxation
+    upper_bound = dantzig_bound(instance.sorted_values, instance.sorted_weights, capacity)
+
+    out_dict = {
+        'solution_array': is_in_array.astype(int),
+        'total_value': total_value,
+        'total_weight': total_weight,
+        'upper_bound': upper_bound,
+        'gap': (upper_bound - total_value) / max(upper_bound, 1),
+        'num_moves': num_moves
+    }
+
+    return out_dict
+
+
+class IncrementalKnapsackSolver:
+    """
+    Knapsack solver that keeps the Pareto frontier after each item between calls, so that a new capacity up
+    to max_capacity is answered straight from the last frontier, and adding items only extends it. Removing
+    an item recomputes the frontiers from that item on, and checkpoints allow removals to be rolled back.
+    Raising max_capacity only adds the states in the new weight band to each frontier.
+    Every frontier is kept, and none is pruned with a bound since any capacity may be asked for later, so
+    memory grows with the total number of states (around 650 MB on ks_1000_0). Parents are stored as int32
+    to keep that down.
+    """
+
+    def __init__(self, input_array, max_capacity):
+        self.max_capacity = max_capacity
+        self.next_item_id = 0
+        self.item_ids = []
+        self.item_values = []
+        self.item_weights = []
+        # one (weights, values, parents, takes) frontier per item, before any item is the empty knapsack
+        self.stage_list = []
+        self.num_stages_computed = 0
+
+        self.add_items(input_array)
+
+    def _get_frontier(self, num_stages):
+        if num_stages == 0:
+            return np.zeros(1, dtype=np.int64), np.zeros(1, dtype=np.int64)
+        return self.stage_list[num_stages - 1][:2]
+
+    def _recompute_stages(self, first_stage):
+        del self.stage_list[first_stage:]
+        state_weights, state_values = self._get_frontier(first_stage)
+        for stage_index in range(first_stage, len(self.item_ids)):
+            merged_weights, merged_values, merged_parents, merged_takes = merge_pareto_frontier(
+                state_weights, state_values, self.item_weights[stage_index], self.item_values[stage_index],
+                self.max_capacity)
+            stage = (merged_weights, merged_values, merged_parents.astype(np.int32), merged_takes)
+            self.stage_list.append(stage)
+            state_weights, state_values = stage[:2]
+            self.num_stages_computed += 1
+
+    def _extend_stages(self, new_capacity):
+        # states up to the old capacity can only be dominated by lighter ones, so they stay as they are. the
+        # new states at stage i come from the previous stage's states above the old capacity (item skipped) or
+        # above the old capacity minus the item's weight (item taken), and are added after the old states so
+        # the parent indexes into the previous frontier stay valid
+        old_capacity = self.max_capacity
+        self.max_capacity = new_capacity
+
+        state_weights, state_values = self._get_frontier(0)
+        for stage_index in range(len(self.item_ids)):
+            old_weights, old_values, old_parents, old_takes = self.stage_list[stage_index]
+            weight, value = self.item_weights[stage_index], self.item_values[stage_index]
+
+            skip_start = int(np.searchsorted(state_weights, old_capacity, side='right'))
+            take_start = int(np.searchsorted(state_weights, old_capacity - weight, side='right'))
+            take_end = int(np.searchsorted(state_weights, new_capacity - weight, side='right'))
+
+            band_weights = np.concatenate((state_weights[skip_start:], state_weights[take_start:take_end] + weight))
+            band_values = np.concatenate((state_values[skip_start:], state_values[take_start:take_end] + value))
+            band_parents = np.concatenate((np.arange(skip_start, state_weights.shape[0]),
+                                           np.arange(take_start, take_end))).astype(np.int32)
+            band_takes = np.concatenate((np.zeros(state_weights.shape[0] - skip_start, dtype=bool),
+                                         np.ones(take_end - take_start, dtype=bool)))
+
+            # the same dominance pruning as merge_pareto_frontier, continuing from the old frontier's best value
+            sort_array = np.lexsort((-band_values, band_weights))
+            band_values = band_values[sort_array]
+            running_max_array = np.maximum.accumulate(np.concatenate((old_values[-1:], band_values)))
+            keep_array = band_values > running_max_array[:-1]
+            sort_array = sort_array[keep_array]
+
+            stage = (np.concatenate((old_weights, band_weights[sort_array])),
+                     np.concatenate((old_values, band_values[keep_array])),
+                     np.concatenate((old_parents, band_parents[sort_array])),
+                     np.concatenate((old_takes, band_takes[sort_array])))
+            self.stage_list[stage_index] = stage
+            state_weights, state_values = stage[:2]
+
+    def add_items(self, input_array):
+        """
+        Add [value, weight] rows as new items, returning their ids.
+        """
+
+        new_item_ids = list(range(self.next_item_id, self.next_item_id + len(input_array)))
+        self.next_item_id += len(input_array)
+
+        first_stage = len(self.item_ids)
+        self.item_ids += new_item_ids
+        instance = get_knapsack_instance(input_array, self.max_capacity)
+        self.item_values += instance.values.tolist()
+        self.item_weights += instance.weights.tolist()
+        self._recompute_stages(first_stage)
+
+        return new_item_ids
+
+    def remove_items(self, item_ids):
+        """
+        Remove items by id. Only the frontiers from the earliest removed item on are recomputed, so removing
+        recently added items is cheapest.
+        """
+
+        item_positions = [self.item_ids.index(item_id) for item_id in item_ids]
+        for item_position in sorted(item_positions, reverse=True):
+            del self.item_ids[item_position]
+            del self.item_values[item_position]
+            del self.item_weights[item_position]
+        self._recompute_stages(min(item_positions, default=len(self.item_ids)))
+
+    def save_checkpoint(self):
+        """
+        Return a checkpoint of the current items. The frontiers are never modified in place, so this only
+        copies the lists that refer to them.
+        """
+
+        return {
+            'max_capacity': self.max_capacity,
+            'item_ids': list(self.item_ids),
+            'item_values': list(self.item_values),
+            'item_weights': list(self.item_weights),
+            'stage_list': list(self.stage_list)
+        }
+
+    def restore_checkpoint(self, checkpoint):
+        """
+        Go back to the items and frontiers of a checkpoint, without recomputing anything.
+        """
+
+        self.max_capacity = checkpoint['max_capacity']
+        self.item_ids = list(checkpoint['item_ids'])
+        self.item_values = list(checkpoint['item_values'])
+        self.item_weights = list(checkpoint['item_weights'])
+        self.stage_list = list(checkpoint['stage_list'])
+
+    def solve(self, capacity):
+        """
+        Return the optimal solution for a capacity, with solution_array following item_ids. A capacity above
+        max_capacity raises it, extending every frontier by the new weight band.
+        """
+
+        if capacity < 0:
+            raise ValueError('capacity must be non-negative, got ' + str(capacity))
+        if capacity > self.max_capacity:
+            self._extend_stages(capacity)
+
+        # the frontier's values increase with weight, so the best state is the heaviest one that fits
+        state_weights, state_values = self._get_frontier(len(self.item_ids))
+        state_index = int(np.searchsorted(state_weights, capacity, side='right')) - 1
+
+        num_items = len(self.item_ids)
+        solution_array = np.zeros(num_items, dtype=int)
+        for stage_index in range(num_items - 1, -1, -1):
+            _, _, parent_array, take_array = self.stage_list[stage_index]
+            if take_array[state_index]:
+                solution_array[stage_index] = 1
+            state_index = parent_array[state_index]
+
+        out_dict = {
+            'solution_array': solution_array,
+            'item_ids': list(self.item_ids),
+            'total_value': int(np.dot(solution_array, self.item_values)) if num_items else 0,
+            'total_weight': int(np.dot(solution_array, self.item_weights)) if num_items else 0
+        }
+
+        return out_dict
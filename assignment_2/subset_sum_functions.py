@@ -0,0 +1,80 @@
+import time
+
+
+def get_reachable_weights(weight_list, capacity=None):
+    """
+    Return a Python int bitset where bit c is set if some subset of the weights sums to c, computed with a
+    single shift-or pass over the weights. Sums above capacity are dropped, if it is given.
+    """
+
+    reachable = 1
+    if capacity is None:
+        for weight in weight_list:
+            reachable |= reachable << int(weight)
+    else:
+        capacity_mask = (1 << (capacity + 1)) - 1
+        for weight in weight_list:
+            reachable |= (reachable << int(weight)) & capacity_mask
+
+    return reachable
+
+
+def get_largest_reachable_weight_from_bitset(reachable, capacity):
+    """
+    Return the largest reachable total weight no more than capacity.
+    """
+
+    return (reachable & ((1 << (capacity + 1)) - 1)).bit_length() - 1
+
+
+def is_weight_reachable(reachable, weight):
+    """
+    Return whether a total weight is reachable.
+    """
+
+    return weight >= 0 and bool((reachable >> weight) & 1)
+
+
+def count_reachable_weights(reachable):
+    """
+    Return the number of distinct reachable total weights.
+    """
+
+    return bin(reachable).count('1')
+
+
+def get_largest_reachable_weight(weight_list, capacity, deadline=None):
+    """
+    Return the largest total weight no more than capacity that some subset of the weights adds up to. Past
+    the deadline it gives up and returns capacity itself.
+    """
+
+    # bit c of reachable is set if a subset of the weights seen so far sums to c
+    capacity_mask = (1 << (capacity + 1)) - 1
+    reachable = 1
+    for weight_index, weight in enumerate(weight_list):
+        reachable |= (reachable << int(weight)) & capacity_mask
+        if reachable >> capacity:
+            break
+        if deadline is not None and weight_index % 64 == 63 and time.time() > deadline:
+            return capacity
+
+    return reachable.bit_length() - 1
+
+
+def can_reach_exact_weight(weight_list, target_weight):
+    """
+    Return whether some subset of the weights sums to exactly target_weight.
+    """
+
+    if target_weight < 0:
+        return False
+
+    target_mask = (1 << (target_weight + 1)) - 1
+    reachable = 1
+    for weight in weight_list:
+        reachable |= (reachable << int(weight)) & target_mask
+        if reachable >> target_weight:
+            return True
+
+    return bool(reachable >> target_weight)
@@ -0,0 +1,176 @@
+import os
+import time
+
+import numpy as np
+from ortools.sat.python import cp_model
+
+from assignment_3.data_processing_functions import load_input_data, ColouringGraph
+from assignment_3.solver import solve_it_cp, solve_it_cp_single_model
+from assignment_3.solving_functions import greedy_colouring, dsatur_colouring, create_model, \
+    create_boolean_model, solve_model, get_solution_dict, get_boolean_solution_dict, greedy_max_clique, \
+    reduce_graph
+
+DATA_DIRECTORY = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data')
+
+
+def load_data_file(file_name):
+    """
+    Return the ColouringGraph and number of nodes of a file in the data directory.
+    """
+
+    with open(os.path.join(DATA_DIRECTORY, file_name), 'r') as input_data_file:
+        input_data = input_data_file.read()
+
+    edge_array, num_nodes = load_input_data(input_data)
+
+    return ColouringGraph(edge_array, num_nodes), num_nodes
+
+
+def is_valid_colouring(graph, solution_array):
+    """
+    Return whether no edge joins two nodes of the same colour.
+    """
+
+    solution_array = np.asarray(solution_array)
+
+    return bool((solution_array[graph.edge_array[:, 0]] != solution_array[graph.edge_array[:, 1]]).all())
+
+
+def benchmark_cp_models(file_names=('gc_50_3', 'gc_70_7', 'gc_100_5', 'gc_250_5', 'gc_500_1', 'gc_250_9', 'gc_500_7',
+                                    'gc_500_9'), max_solve_time=30, max_boolean_edge_colours=10 ** 7):
+    """
+    Compare the integer model with reified channelling (create_model) against the boolean only model
+    (create_boolean_model) on build time, number of variables and constraints, solve time and colours, both
+    with the colour count bounded by the best of greedy and DSATUR. The dense instances at the end are where
+    the boolean model's clause per edge and colour makes its build slow and large. The boolean model is
+    skipped (status SKIPPED) above max_boolean_edge_colours edges times colours, as gc_500_9's 18.4M clauses
+    need more than 5GB.
+    """
+
+    model_builders = [
+        ('integer', lambda graph, num_nodes, max_obj: create_model(graph, num_nodes, max_obj=max_obj),
+         lambda variables, solver, num_nodes: get_solution_dict(variables[1], solver, num_nodes)),
+        ('boolean', lambda graph, num_nodes, max_obj: create_boolean_model(graph, num_nodes, max_obj=max_obj),
+         lambda variables, solver, num_nodes: get_boolean_solution_dict(variables[1], solver, num_nodes))
+    ]
+
+    result_list = []
+    for file_name in file_names:
+        graph, num_nodes = load_data_file(file_name)
+        max_obj = min(greedy_colouring(graph)['num_colours'], dsatur_colouring(graph)['num_colours'])
+        num_edge_colours = graph.edge_array.shape[0] * max_obj
+
+        for model_name, build_model, get_model_solution_dict in model_builders:
+            if model_name == 'boolean' and num_edge_colours > max_boolean_edge_colours:
+                result_list.append({
+                    'file_name': file_name,
+                    'model_name': model_name,
+                    'max_colours': max_obj,
+                    'num_edge_colours': num_edge_colours,
+                    'status': 'SKIPPED'
+                })
+                continue
+
+            start_time = time.time()
+            model_variables = build_model(graph, num_nodes, max_obj)
+            build_time = time.time() - start_time
+            model_proto = model_variables[0].Proto()
+
+            start_time = time.time()
+            _, solver, status = solve_model(model_variables[0], max_solve_time=max_solve_time)
+            solve_time = time.time() - start_time
+
+            result_dict = {
+                'file_name': file_name,
+                'model_name': model_name,
+                'max_colours': max_obj,
+                'num_edge_colours': num_edge_colours,
+                'build_time': build_time,
+                'num_variables': len(model_proto.variables),
+                'num_constraints': len(model_proto.constraints),
+                'solve_time': solve_time,
+                'status': solver.StatusName(status)
+            }
+            if status in (cp_model.OPTIMAL, cp_model.FEASIBLE):
+                solution_dict = get_model_solution_dict(model_variables, solver, num_nodes)
+                result_dict['num_colours'] = solution_dict['num_colours']
+                result_dict['is_valid'] = is_valid_colouring(graph, solution_dict['solution_array'])
+            result_list.append(result_dict)
+
+    return result_list
+
+
+def benchmark_descending_k(file_names=('gc_50_3', 'gc_70_7', 'gc_100_5', 'gc_250_5'), max_solve_time=60,
+                           step_time=20):
+    """
+    Compare one optimisation model over the colour range (solve_it_cp_single_model) against the hinted
+    descending k feasibility models (solve_it_cp), with the same overall time limit.
+    """
+
+    result_list = []
+    for file_name in file_names:
+        graph, num_nodes = load_data_file(file_name)
+
+        start_time = time.time()
+        single_solution_dict = solve_it_cp_single_model(graph, num_nodes, max_solve_time=max_solve_time)
+        single_time = time.time() - start_time
+
+        start_time = time.time()
+        descending_solution_dict = solve_it_cp(graph, num_nodes, max_solve_time=max_solve_time, step_time=step_time)
+        descending_time = time.time() - start_time
+
+        result_list.append({
+            'file_name': file_name,
+            'single_num_colours': single_solution_dict['num_colours'],
+            'single_is_provably_optimal': single_solution_dict['is_provably_optimal'],
+            'single_time': single_time,
+            'descending_num_colours': descending_solution_dict['num_colours'],
+            'descending_is_provably_optimal': descending_solution_dict['is_provably_optimal'],
+            'descending_time': descending_time,
+            'descending_steps': descending_solution_dict['step_list']
+        })
+
+    return result_list
+
+
+def benchmark_reduction(file_names=None):
+    """
+    Report how much low degree peeling and dominated node merging, with the clique size as k, shrink each
+    instance in the data directory.
+    """
+
+    if file_names is None:
+        file_names = sorted(os.listdir(DATA_DIRECTORY), key=lambda file_name: (len(file_name), file_name))
+
+    result_list = []
+    for file_name in file_names:
+        graph, num_nodes = load_data_file(file_name)
+        clique = greedy_max_clique(graph)
+
+        start_time = time.time()
+        core_nodes, removal_list = reduce_graph(graph, len(clique))
+        reduction_time = time.time() - start_time
+        core_graph = graph.subgraph(core_nodes)
+
+        result_list.append({
+            'file_name': file_name,
+            'lower_bound': len(clique),
+            'num_nodes': num_nodes,
+            'num_core_nodes': core_graph.num_nodes,
+            'num_edges': graph.num_edges,
+            'num_core_edges': core_graph.num_edges,
+            'num_peeled': sum(dominator < 0 for _, dominator in removal_list),
+            'num_merged': sum(dominator >= 0 for _, dominator in removal_list),
+            'reduction_time': reduction_time
+        })
+
+    return result_list
+
+
+if __name__ == '__main__':
+    for result_dict in benchmark_cp_models():
+        print(result_dict)
+    for result_dict in benchmark_descending_k():
+        print(result_dict)
+    for result_dict in benchmark_reduction():
+        print(result_dict)
@@ -13,16 +13,103 @@ def load_input_data(input_data):
     num_nodes = int(firstLine[0])
     num_edges = int(firstLine[1])
 
-    out_array = np.zeros((num_edges, 2))
-
-    for i in range(num_edges):
-        line = lines[i + 1]
-        parts = line.split()
-        out_array[i] = np.array([int(parts[0]), int(parts[1])])
+    out_array = np.array(' '.join(lines[1:num_edges + 1]).split(), dtype=np.int64).reshape(num_edges, 2)
 
     return out_array, num_nodes
 
 
+class ColouringGraph:
+    """
+    An undirected graph in CSR form: the neighbours of node i are indices[indptr[i]:indptr[i + 1]], in
+    ascending order, and degrees[i] is their count. Built once from the edge array and shared by the
+    colouring heuristics, the node orderings and the CP model.
+    """
+
+    __slots__ = ('num_nodes', 'edge_array', 'indptr', 'indices', 'degrees', '_neighbour_lists', '_neighbour_bitsets')
+
+    def __init__(self, edge_array, num_nodes):
+        self.num_nodes = int(num_nodes)
+        self.edge_array = np.ascontiguousarray(edge_array, dtype=np.int64).reshape(-1, 2)
+
+        # both directions of every edge, grouped by source node
+        sources = np.concatenate((self.edge_array[:, 0], self.edge_array[:, 1]))
+        targets = np.concatenate((self.edge_array[:, 1], self.edge_array[:, 0]))
+        sort_array = np.argsort(sources * max(self.num_nodes, 1) + targets)
+
+        self.degrees = np.bincount(sources, minlength=self.num_nodes)
+        self.indptr = np.zeros(self.num_nodes + 1, dtype=np.int64)
+        np.cumsum(self.degrees, out=self.indptr[1:])
+        self.indices = targets[sort_array]
+        self._neighbour_lists = None
+        self._neighbour_bitsets = None
+
+    @property
+    def num_edges(self):
+        return self.edge_array.shape[0]
+
+    def subgraph(self, node_array):
+        """
+        Return the graph induced by the nodes in node_array, renumbered 0, 1, ... in that order.
+        """
+
+        node_array = np.asarray(node_array, dtype=np.int64)
+        new_index_array = np.full(self.num_nodes, -1, dtype=np.int64)
+        new_index_array[node_array] = np.arange(node_array.shape[0])
+
+        new_edge_array = new_index_array[self.edge_array]
+        new_edge_array = new_edge_array[(new_edge_array >= 0).all(axis=1)]
+
+        return ColouringGraph(new_edge_array, node_array.shape[0])
+
+    def neighbours(self, node):
+        """
+        Return a view of a node's neighbours.
+        """
+
+        return self.indices[self.indptr[node]:self.indptr[node + 1]]
+
+    def neighbour_lists(self):
+        """
+        Return the neighbours as python lists, for the loops where numpy scalars would be slow. Built on the
+        first call and kept.
+        """
+
+        if self._neighbour_lists is None:
+            indices, indptr = self.indices.tolist(), self.indptr.tolist()
+            self._neighbour_lists = [indices[indptr[node]:indptr[node + 1]] for node in range(self.num_nodes)]
+
+        return self._neighbour_lists
+
+    def neighbour_bitsets(self):
+        """
+        Return each node's neighbours as a python int with bit j set for neighbour j, packed from the rows of
+        the adjacency matrix. Built on the first call and kept.
+        """
+
+        if self._neighbour_bitsets is None:
+            adjacency_array = np.zeros((self.num_nodes, self.num_nodes), dtype=bool)
+            adjacency_array[np.repeat(np.arange(self.num_nodes), self.degrees), self.indices] = True
+            packed_array = np.packbits(adjacency_array, axis=1, bitorder='little')
+            self._neighbour_bitsets = [int.from_bytes(packed_row.tobytes(), 'little') for packed_row in packed_array]
+
+        return self._neighbour_bitsets
+
+
+def get_colouring_graph(edge_array, num_nodes=None):
+    """
+    Return edge_array unchanged if it is already a ColouringGraph, otherwise build one. Without num_nodes the
+    nodes are numbered up to the largest one in an edge.
+    """
+
+    if isinstance(edge_array, ColouringGraph):
+        return edge_array
+
+    if num_nodes is None:
+        num_nodes = int(edge_array.max()) + 1 if edge_array.shape[0] else 0
+
+    return ColouringGraph(edge_array, num_nodes)
+
+
 def prepare_output_data(solution_dict, is_provably_optimal=False):
     """
     Return output in specified format.
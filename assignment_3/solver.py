@@ -1,8 +1,26 @@
 #!/usr/bin/python
 # -*- coding: utf-8 -*-
 
-from assignment_3.data_processing_functions import load_input_data, prepare_output_data
-from assignment_3.solving_functions import greedy_colouring, create_model, solve_model, get_solution_dict
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+from ortools.sat.python import cp_model
+
+from assignment_3.data_processing_functions import load_input_data, prepare_output_data, ColouringGraph
+from assignment_3.solving_functions import greedy_colouring, dsatur_colouring, solve_model, tabucol_decreasing_k, \
+    create_boolean_model, get_boolean_solution_dict, greedy_max_clique, solve_descending_k, reduce_graph, \
+    restore_colouring, get_connected_components
+
+# time budget for the tabu search on the instances too big for the CP model
+TABU_TIME_LIMIT = 120
+
+# time slice for each k-colourability model in the descending k search
+CP_STEP_TIME_LIMIT = 60
+
+# the boolean model has a clause per edge and colour, and above this many its build alone takes over 10
+# seconds and hundreds of megabytes, so denser graphs go to the tabu search instead
+CP_MAX_EDGE_COLOURS = 1500000
+
 
 def solve_it_trivial(input_data):
     # Modify this code to run your optimization algorithm
@@ -31,35 +49,145 @@ def solve_it_trivial(input_data):
     return output_data
 
 
-def solve_it_cp(edge_array, num_nodes, max_solve_time=600):
-    greedy_solution_dict = greedy_colouring(edge_array)
+def solve_it_cp(graph, num_nodes, max_solve_time=600, step_time=CP_STEP_TIME_LIMIT):
+    heuristic_solution_dict = solve_it_heuristic(graph, num_nodes)
+    clique = greedy_max_clique(graph)
+
+    # one k-colourability model per k below the heuristic colouring, until one is infeasible. the clique
+    # needs as many colours as it has nodes, so a colouring that matches it is optimal straight away
+    solution_dict = solve_descending_k(graph, num_nodes, heuristic_solution_dict, clique=clique,
+                                       step_time=step_time, max_time=max_solve_time)
+
+    return solution_dict
+
+
+def solve_it_cp_single_model(graph, num_nodes, max_solve_time=600):
+    heuristic_solution_dict = solve_it_heuristic(graph, num_nodes)
+    clique = greedy_max_clique(graph)
 
-    max_obj = greedy_solution_dict['num_colours']
+    # the clique needs as many colours as it has nodes, so a colouring that matches it is optimal
+    heuristic_solution_dict['is_provably_optimal'] = heuristic_solution_dict['num_colours'] == len(clique)
+    if heuristic_solution_dict['is_provably_optimal']:
+        return heuristic_solution_dict
 
-    model, nc_vars, ncb_vars, cu_vars, obj_val_var = create_model(edge_array, num_nodes, max_obj=max_obj)
+    max_obj = heuristic_solution_dict['num_colours']
+
+    model, ncb_vars, cu_vars, obj_val_var = create_boolean_model(graph, num_nodes, max_obj=max_obj, clique=clique)
 
     model, solv, stat = solve_model(model, max_solve_time=max_solve_time)
 
-    solution_dict = get_solution_dict(nc_vars, solv, num_nodes)
+    # keep the heuristic colouring if the model didn't find one in time
+    if stat not in (cp_model.OPTIMAL, cp_model.FEASIBLE):
+        return heuristic_solution_dict
+
+    solution_dict = get_boolean_solution_dict(ncb_vars, solv, num_nodes)
+    solution_dict['is_provably_optimal'] = stat == cp_model.OPTIMAL or solution_dict['num_colours'] == len(clique)
+
+    return solution_dict
+
+
+def solve_it_greedy(graph):
+
+    return greedy_colouring(graph)
+
+
+def solve_it_dsatur(graph, num_nodes):
+
+    return dsatur_colouring(graph, num_nodes)
+
+
+def solve_it_heuristic(graph, num_nodes):
+    # dsatur usually needs fewer colours, but not on every instance
+    return min(solve_it_dsatur(graph, num_nodes), solve_it_greedy(graph),
+               key=lambda solution_dict: solution_dict['num_colours'])
+
+
+def solve_it_tabu(graph, num_nodes, max_time=TABU_TIME_LIMIT):
+    clique = greedy_max_clique(graph)
+
+    solution_dict = tabucol_decreasing_k(graph, solve_it_heuristic(graph, num_nodes), max_time=max_time,
+                                         lower_bound=len(clique))
+    solution_dict['is_provably_optimal'] = solution_dict['num_colours'] == len(clique)
 
     return solution_dict
 
 
-def solve_it_greedy(edge_array):
+def solve_it_core(graph):
+
+    if graph.num_nodes <= 500:
+        num_colours = solve_it_heuristic(graph, graph.num_nodes)['num_colours']
+        if graph.edge_array.shape[0] * num_colours <= CP_MAX_EDGE_COLOURS:
+            return solve_it_cp(graph, graph.num_nodes)
+
+    return solve_it_tabu(graph, graph.num_nodes)
+
+
+def solve_it_components(graph, max_workers=None):
+    """
+    Colour each connected component on its own, the components with more than one node in a process pool,
+    and merge the colourings. The graph needs as many colours as its hardest component, so the result is
+    optimal if a component with that many colours was proven optimal.
+    """
+
+    component_array = get_connected_components(graph)
+    num_components = int(component_array.max()) + 1 if graph.num_nodes else 0
+
+    if num_components <= 1:
+        return solve_it_core(graph)
 
-    return greedy_colouring(edge_array)
+    # the nodes of each component, the largest first so the long jobs don't start last
+    sort_array = np.argsort(component_array, kind='stable')
+    split_array = np.cumsum(np.bincount(component_array, minlength=num_components))[:-1]
+    component_nodes_list = sorted(np.split(sort_array, split_array), key=len, reverse=True)
+
+    # single nodes take the first colour
+    solution_array = np.zeros(graph.num_nodes, dtype=int)
+    num_colours = 1
+    is_provably_optimal = True
+
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        future_dict = {executor.submit(solve_it_core, graph.subgraph(component_nodes)): component_nodes
+                       for component_nodes in component_nodes_list if len(component_nodes) > 1}
+        for future in as_completed(future_dict):
+            component_solution_dict = future.result()
+            solution_array[future_dict[future]] = component_solution_dict['solution_array']
+
+            if component_solution_dict['num_colours'] > num_colours:
+                num_colours = component_solution_dict['num_colours']
+                is_provably_optimal = component_solution_dict['is_provably_optimal']
+            elif component_solution_dict['num_colours'] == num_colours:
+                is_provably_optimal |= component_solution_dict['is_provably_optimal']
+
+    solution_dict = {
+        'solution_array': solution_array,
+        'num_colours': num_colours,
+        'is_provably_optimal': is_provably_optimal,
+        'num_components': num_components
+    }
+
+    return solution_dict
 
 
 def solve_it(input_data):
 
     edge_array, num_nodes = load_input_data(input_data)
 
-    if num_nodes <= 500:
-        solution_dict = solve_it_cp(edge_array, num_nodes)
-    else:
-        solution_dict = solve_it_greedy(edge_array)
+    # one adjacency shared by every stage
+    graph = ColouringGraph(edge_array, num_nodes)
+
+    # nodes that can always be coloured once the rest is are left out of the expensive search
+    clique = greedy_max_clique(graph)
+    core_nodes, removal_list = reduce_graph(graph, len(clique))
+    core_graph = graph.subgraph(core_nodes)
+
+    # peeling can also split the core apart
+    core_solution_dict = solve_it_components(core_graph)
+
+    # the removed nodes never need more colours than the clique or the core
+    solution_dict = restore_colouring(graph, core_nodes, core_solution_dict['solution_array'], removal_list)
+    is_provably_optimal = core_solution_dict['is_provably_optimal'] or solution_dict['num_colours'] == len(clique)
 
-    output_data = prepare_output_data(solution_dict, is_provably_optimal=False)
+    output_data = prepare_output_data(solution_dict, is_provably_optimal=is_provably_optimal)
 
     return output_data
 
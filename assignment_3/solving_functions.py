@@ -1,108 +1,445 @@
+import heapq
+import time
+
 import numpy as np
 from ortools.sat.python import cp_model
 
+from assignment_3.data_processing_functions import get_colouring_graph
+
+
+def greedy_colouring(graph):
+    graph = get_colouring_graph(graph)
+    neighbour_lists = graph.neighbour_lists()
 
-def greedy_colouring(edge_array):
-    def color_nodes(graph):
-        color_map = {}
-        # Consider nodes in descending degree
-        for node in sorted(graph, key=lambda x: len(graph[x]), reverse=True):
-            neighbor_colors = set(color_map.get(neigh) for neigh in graph[node])
-            color_map[node] = next(
-                color for color in range(len(graph)) if color not in neighbor_colors
-            )
-        return color_map
-
-    node_neighbour_dict = {}
-
-    for edge_index in range(edge_array.shape[0]):
-        v0, v1 = int(edge_array[edge_index, 0]), int(edge_array[edge_index, 1])
-        if v0 not in node_neighbour_dict:
-            node_neighbour_dict[v0] = []
-        node_neighbour_dict[v0].append(v1)
-        if v1 not in node_neighbour_dict:
-            node_neighbour_dict[v1] = []
-        node_neighbour_dict[v1].append(v0)
-
-    solution_dict = color_nodes(node_neighbour_dict)
-
-    solution_array = np.zeros(int(edge_array.max() + 1))
-    obj_val = 0
-    for i in range(int(edge_array.max() + 1)):
-        colour = solution_dict[i]
-        solution_array[i] = colour
-        obj_val = max(obj_val, colour)
+    colour_array = [-1] * graph.num_nodes
+    # Consider nodes in descending degree
+    for node in order_nodes_by_order_desc(graph):
+        neighbour_colours = set(colour_array[neighbour] for neighbour in neighbour_lists[node])
+        colour_array[node] = next(
+            colour for colour in range(graph.num_nodes) if colour not in neighbour_colours
+        )
 
     out_dict = {
-        'solution_array': solution_array.astype(int),
-        'num_colours': obj_val + 1
+        'solution_array': np.array(colour_array, dtype=int),
+        'num_colours': max(colour_array, default=-1) + 1
+    }
+
+    return out_dict
+
+
+def dsatur_colouring(graph, num_nodes=None):
+    """
+    DSATUR: repeatedly colour the uncoloured node with the most distinct neighbour colours (its saturation),
+    ties broken by degree, with the lowest colour free among its neighbours. Each node's neighbour colours
+    are a python int bitset, and the nodes sit in a binary heap per saturation level so that the degree tie
+    break is kept. A step costs O(degree log n), a heap push per neighbour whose saturation goes up, rather
+    than the O(degree) of plain buckets, which can't order a level by degree.
+    """
+
+    graph = get_colouring_graph(graph, num_nodes)
+    num_nodes = graph.num_nodes
+    neighbour_lists = graph.neighbour_lists()
+    degrees = graph.degrees.tolist()
+
+    colour_array = [-1] * num_nodes
+    colour_bitsets = [0] * num_nodes
+    saturations = [0] * num_nodes
+
+    # bucket s holds (-degree, node) for the nodes with saturation s. nodes aren't removed when their
+    # saturation goes up, stale entries are skipped when they reach the top instead
+    buckets = [[] for _ in range(num_nodes + 1)]
+    buckets[0] = [(-degree, node) for node, degree in enumerate(degrees)]
+    heapq.heapify(buckets[0])
+    max_saturation = 0
+    num_colours = 0
+
+    for _ in range(num_nodes):
+        while True:
+            while not buckets[max_saturation]:
+                max_saturation -= 1
+            _, node = heapq.heappop(buckets[max_saturation])
+            if colour_array[node] == -1 and saturations[node] == max_saturation:
+                break
+
+        # the lowest zero bit of the bitset is the first free colour
+        bitset = colour_bitsets[node]
+        colour = (~bitset & (bitset + 1)).bit_length() - 1
+        colour_bitsets[node] = 0
+        colour_array[node] = colour
+        num_colours = max(num_colours, colour + 1)
+
+        colour_bit = 1 << colour
+        for neighbour in neighbour_lists[node]:
+            if colour_array[neighbour] == -1 and not colour_bitsets[neighbour] & colour_bit:
+                colour_bitsets[neighbour] |= colour_bit
+                saturations[neighbour] += 1
+                heapq.heappush(buckets[saturations[neighbour]], (-degrees[neighbour], neighbour))
+                max_saturation = max(max_saturation, saturations[neighbour])
+
+    out_dict = {
+        'solution_array': np.array(colour_array, dtype=int),
+        'num_colours': num_colours
+    }
+
+    return out_dict
+
+
+def get_conflict_table(graph, colour_array, num_colours):
+    """
+    Return the N x num_colours table of how many neighbours of each node have each colour.
+    """
+
+    sources = np.repeat(np.arange(graph.num_nodes), graph.degrees)
+    conflict_table = np.bincount(sources * num_colours + colour_array[graph.indices],
+                                 minlength=graph.num_nodes * num_colours)
+
+    return conflict_table.reshape(graph.num_nodes, num_colours).astype(np.int64)
+
+
+def tabucol(graph, colour_array, num_colours, max_time=10, max_iterations=10 ** 7, seed=0):
+    """
+    TabuCol local search for a colouring with num_colours colours, starting from colour_array (which may have
+    conflicts). Each move recolours a conflicting node, picking the best move by vectorised argmin over the
+    conflicting rows of the conflict table, with random tie breaks. Moving a node away from a colour makes
+    moving it back tabu for a tenure that grows with the number of conflicts, unless the move would beat the
+    best number of conflicts seen (aspiration). Stops at zero conflicts, or after max_time seconds or
+    max_iterations moves with the least conflicting colouring found.
+    """
+
+    start_time = time.time()
+    rng = np.random.default_rng(seed)
+
+    colour_array = np.array(colour_array, dtype=np.int64)
+    conflict_table = get_conflict_table(graph, colour_array, num_colours)
+    tabu_table = np.zeros((graph.num_nodes, num_colours), dtype=np.int64)
+    node_indexes = np.arange(graph.num_nodes)
+
+    num_conflicts = int(conflict_table[node_indexes, colour_array].sum()) // 2
+    best_num_conflicts = num_conflicts
+    best_colour_array = colour_array.copy()
+
+    iteration = 0
+    while num_conflicts > 0 and iteration < max_iterations:
+        if iteration % 1000 == 0 and time.time() - start_time > max_time:
+            break
+        iteration += 1
+
+        # the change in conflicts from moving each conflicting node to each colour
+        conflicting_nodes = np.nonzero(conflict_table[node_indexes, colour_array] > 0)[0]
+        conflicting_colours = colour_array[conflicting_nodes]
+        delta_array = conflict_table[conflicting_nodes] - \
+            conflict_table[conflicting_nodes, conflicting_colours][:, None]
+
+        # tabu moves are only allowed if they beat the best so far, and staying put isn't a move
+        is_allowed_array = (tabu_table[conflicting_nodes] < iteration) | \
+            (num_conflicts + delta_array < best_num_conflicts)
+        is_allowed_array[np.arange(conflicting_nodes.shape[0]), conflicting_colours] = False
+        if not is_allowed_array.any():
+            continue
+
+        # deltas are integers, so the noise only breaks ties
+        score_array = np.where(is_allowed_array, delta_array + rng.random(delta_array.shape),
+                               np.iinfo(np.int64).max)
+        row_index, new_colour = np.unravel_index(np.argmin(score_array), score_array.shape)
+        node = conflicting_nodes[row_index]
+        old_colour = colour_array[node]
+
+        # only the moved node's neighbours see their table rows change
+        neighbours = graph.neighbours(node)
+        conflict_table[neighbours, old_colour] -= 1
+        conflict_table[neighbours, new_colour] += 1
+        colour_array[node] = new_colour
+        num_conflicts += int(delta_array[row_index, new_colour])
+
+        tabu_table[node, old_colour] = iteration + int(0.6 * conflicting_nodes.shape[0]) + int(rng.integers(10))
+
+        if num_conflicts < best_num_conflicts:
+            best_num_conflicts = num_conflicts
+            best_colour_array = colour_array.copy()
+
+    out_dict = {
+        'solution_array': best_colour_array.astype(int),
+        'num_colours': num_colours,
+        'num_conflicts': best_num_conflicts,
+        'num_iterations': iteration
     }
 
     return out_dict
 
 
-def order_nodes_by_order_desc(edge_array):
-    node_order_dict = {}
+def merge_highest_colour(graph, colour_array, num_colours):
+    """
+    Return a colouring with one colour fewer, moving each node of the highest colour to the colour it
+    conflicts least with.
+    """
+
+    colour_array = np.array(colour_array, dtype=np.int64)
+
+    conflict_table = get_conflict_table(graph, colour_array, num_colours)
+    for node in np.nonzero(colour_array == num_colours - 1)[0]:
+        new_colour = int(np.argmin(conflict_table[node, :num_colours - 1]))
+        conflict_table[graph.neighbours(node), num_colours - 1] -= 1
+        conflict_table[graph.neighbours(node), new_colour] += 1
+        colour_array[node] = new_colour
+
+    return colour_array
+
+
+def tabucol_decreasing_k(graph, solution_dict, max_time=60, seed=0, lower_bound=1):
+    """
+    Starting from a valid colouring, repeatedly merge away the highest colour and repair the result with
+    TabuCol, until a repair fails within the time left or the colours reach lower_bound. Returns the fewest
+    colours found.
+    """
+
+    start_time = time.time()
+    graph = get_colouring_graph(graph)
+
+    best_solution_dict = dict(solution_dict)
+    num_colours = solution_dict['num_colours']
+
+    while num_colours > max(lower_bound, 1):
+        remaining_time = max_time - (time.time() - start_time)
+        if remaining_time <= 0:
+            break
+
+        colour_array = merge_highest_colour(graph, best_solution_dict['solution_array'], num_colours)
+        tabu_solution_dict = tabucol(graph, colour_array, num_colours - 1, max_time=remaining_time, seed=seed)
+        if tabu_solution_dict['num_conflicts'] > 0:
+            break
+
+        num_colours -= 1
+        best_solution_dict = {
+            'solution_array': tabu_solution_dict['solution_array'],
+            'num_colours': num_colours
+        }
+
+    return best_solution_dict
+
+
+def greedy_max_clique(graph, max_starts=100):
+    """
+    Greedy clique search on neighbour bitsets from each of the max_starts highest degree nodes: keep adding
+    the candidate with the most neighbours among the remaining candidates, where the candidates are the
+    nodes adjacent to the whole clique so far. Returns the largest clique found as a list of nodes, whose
+    size is a lower bound on the number of colours.
+    """
+
+    graph = get_colouring_graph(graph)
+    neighbour_bitsets = graph.neighbour_bitsets()
+    degrees = graph.degrees.tolist()
+
+    best_clique = []
+    for start_node in order_nodes_by_order_desc(graph)[:max_starts]:
+        # nodes come by degree, so later ones can't be in a bigger clique
+        if degrees[start_node] + 1 <= len(best_clique):
+            break
+
+        clique = [start_node]
+        candidates = neighbour_bitsets[start_node]
+        while candidates and len(clique) + candidates.bit_count() > len(best_clique):
+            best_node, best_count = -1, -1
+            remaining_candidates = candidates
+            while remaining_candidates:
+                lowest_bit = remaining_candidates & -remaining_candidates
+                node = lowest_bit.bit_length() - 1
+                remaining_candidates ^= lowest_bit
+                count = (neighbour_bitsets[node] & candidates).bit_count()
+                if count > best_count:
+                    best_node, best_count = node, count
+            clique.append(best_node)
+            candidates &= neighbour_bitsets[best_node]
+
+        if len(clique) > len(best_clique):
+            best_clique = clique
+
+    return best_clique
+
+
+def create_clique_constraints(model, node_colour_bool_variables, obj_val_variable, clique):
+    # the clique nodes need distinct colours anyway, so fixing them to the first colours only removes
+    # symmetric solutions, and the clique size bounds the objective
+    for colour_index, node_index in enumerate(clique):
+        model.Add(node_colour_bool_variables[(node_index, colour_index)] == 1)
+    model.Add(obj_val_variable >= len(clique))
+
+    return model
+
+
+def get_dominated_nodes(graph, is_alive_array):
+    """
+    Return (node, dominator) pairs among the alive nodes, where the node's alive neighbours are all neighbours
+    of its non-adjacent dominator, so it can always take the dominator's colour. No dominator is itself in a
+    pair, so they can all be removed together.
+    """
+
+    alive_nodes = np.nonzero(is_alive_array)[0]
+    adjacency_array = np.zeros((graph.num_nodes, graph.num_nodes), dtype=np.float32)
+    adjacency_array[np.repeat(np.arange(graph.num_nodes), graph.degrees), graph.indices] = 1
+    adjacency_array = adjacency_array[np.ix_(alive_nodes, alive_nodes)]
+
+    # u is dominated by v when all of u's neighbours are common neighbours of u and v
+    common_array = adjacency_array @ adjacency_array
+    is_dominated_array = (common_array == adjacency_array.sum(axis=1)[:, None]) & (adjacency_array == 0)
+    np.fill_diagonal(is_dominated_array, False)
+
+    dominated_list = []
+    is_removed_array = np.zeros(alive_nodes.shape[0], dtype=bool)
+    is_dominator_array = np.zeros(alive_nodes.shape[0], dtype=bool)
+    for node_index in np.nonzero(is_dominated_array.any(axis=1))[0]:
+        if is_dominator_array[node_index]:
+            continue
+        dominator_indexes = np.nonzero(is_dominated_array[node_index] & ~is_removed_array)[0]
+        if dominator_indexes.shape[0] == 0:
+            continue
+        dominated_list.append((int(alive_nodes[node_index]), int(alive_nodes[dominator_indexes[0]])))
+        is_removed_array[node_index] = True
+        is_dominator_array[dominator_indexes[0]] = True
+
+    return dominated_list
+
+
+def reduce_graph(graph, lower_bound, merge_dominated=True):
+    """
+    Shrink the graph before colouring with k = lower_bound colours. Nodes with fewer than k remaining
+    neighbours are peeled off, since they can always be coloured last, and dominated nodes are merged into
+    their dominator. The two alternate until neither removes anything. Returns the core node indexes and
+    the removals, in order, as (node, dominator) with dominator -1 for peeled nodes.
+    """
+
+    graph = get_colouring_graph(graph)
+    is_alive_array = np.ones(graph.num_nodes, dtype=bool)
+    degrees = graph.degrees.copy()
+    sources = np.repeat(np.arange(graph.num_nodes), graph.degrees)
+    removal_list = []
+
+    while True:
+        num_removed = len(removal_list)
+
+        # peel in rounds, all the low degree nodes of a round at once
+        peel_nodes = np.nonzero(is_alive_array & (degrees < lower_bound))[0]
+        while peel_nodes.shape[0] > 0:
+            removal_list += [(int(node), -1) for node in peel_nodes]
+            is_alive_array[peel_nodes] = False
+            is_peeled_array = np.zeros(graph.num_nodes, dtype=bool)
+            is_peeled_array[peel_nodes] = True
+            degrees -= np.bincount(sources[is_peeled_array[graph.indices]], minlength=graph.num_nodes)
+            peel_nodes = np.nonzero(is_alive_array & (degrees < lower_bound))[0]
+
+        if merge_dominated and is_alive_array.any():
+            dominated_list = get_dominated_nodes(graph, is_alive_array)
+            removal_list += dominated_list
+            for node, _ in dominated_list:
+                is_alive_array[node] = False
+                degrees[graph.neighbours(node)] -= 1
+
+        if len(removal_list) == num_removed:
+            break
+
+    return np.nonzero(is_alive_array)[0], removal_list
+
+
+def restore_colouring(graph, core_nodes, core_colour_array, removal_list):
+    """
+    Colour the removed nodes back in reverse order of removal on top of the core colouring: merged nodes take
+    their dominator's colour and peeled nodes the lowest colour free among their coloured neighbours.
+    """
+
+    graph = get_colouring_graph(graph)
+    neighbour_lists = graph.neighbour_lists()
+
+    colour_array = [-1] * graph.num_nodes
+    for node, colour in zip(np.asarray(core_nodes).tolist(), np.asarray(core_colour_array).tolist()):
+        colour_array[node] = colour
+
+    for node, dominator in reversed(removal_list):
+        if dominator >= 0:
+            colour_array[node] = colour_array[dominator]
+        else:
+            neighbour_colours = set(colour_array[neighbour] for neighbour in neighbour_lists[node])
+            colour_array[node] = next(colour for colour in range(graph.num_nodes)
+                                      if colour not in neighbour_colours)
+
+    out_dict = {
+        'solution_array': np.array(colour_array, dtype=int),
+        'num_colours': max(colour_array, default=-1) + 1
+    }
+
+    return out_dict
 
-    for node_index in range(int(edge_array.max()) + 1):
-        count_node_edges = (edge_array == node_index).sum()
-        node_order_dict[node_index] = count_node_edges
 
-    node_by_order_desc = [tup[0] for tup in sorted(node_order_dict.items(), key=lambda x: x[1], reverse=True)]
+def get_connected_components(graph):
+    """
+    Return each node's connected component label, numbered 0, 1, ... in order of the components' lowest
+    nodes. A vectorised union-find over the edge array: every edge hooks the larger of its endpoints' roots
+    onto the smaller, then pointer jumping compresses the paths, until no edge joins two roots.
+    """
 
-    return node_by_order_desc
+    graph = get_colouring_graph(graph)
+    label_array = np.arange(graph.num_nodes)
+    v0_array, v1_array = graph.edge_array[:, 0], graph.edge_array[:, 1]
 
+    while True:
+        # hook: each root takes the smallest root it is joined to by an edge
+        root0_array, root1_array = label_array[v0_array], label_array[v1_array]
+        if (root0_array == root1_array).all():
+            break
+        np.minimum.at(label_array, np.maximum(root0_array, root1_array), np.minimum(root0_array, root1_array))
 
-def order_nodes_by_neighbours_order_descending(edge_array):
-    node_neighbour_dict = {}
+        # shortcut: point every node straight at its root
+        while True:
+            next_label_array = label_array[label_array]
+            if (next_label_array == label_array).all():
+                break
+            label_array = next_label_array
 
-    for edge_index in range(edge_array.shape[0]):
-        v0, v1 = int(edge_array[edge_index, 0]), int(edge_array[edge_index, 1])
-        if v0 not in node_neighbour_dict:
-            node_neighbour_dict[v0] = []
-        node_neighbour_dict[v0].append(v1)
-        if v1 not in node_neighbour_dict:
-            node_neighbour_dict[v1] = []
-        node_neighbour_dict[v1].append(v0)
+    _, component_array = np.unique(label_array, return_inverse=True)
 
-    node_neighbours_order_dict = {}
-    for node, neighbours in node_neighbour_dict.items():
-        node_neighbours_neighbors = 0
-        for neighbour in neighbours:
-            node_neighbours_neighbors += len(node_neighbour_dict[neighbour])
-        node_neighbours_order_dict[node] = node_neighbours_neighbors
+    return component_array
 
-    out_list = [tup[0] for tup in sorted(node_neighbours_order_dict.items(), key=lambda x: x[1], reverse=True)]
 
-    return out_list
+def order_nodes_by_order_desc(graph):
+    graph = get_colouring_graph(graph)
 
+    return np.argsort(-graph.degrees, kind='stable').tolist()
 
-def create_node_colour_variables(model, edge_array, num_nodes, num_colours=None):
+
+def order_nodes_by_neighbours_order_descending(graph):
+    graph = get_colouring_graph(graph)
+
+    # sum of the neighbours' degrees, per node, from the running total over the CSR indices
+    cumulative_degrees = np.concatenate(([0], np.cumsum(graph.degrees[graph.indices])))
+    node_neighbours_neighbours = cumulative_degrees[graph.indptr[1:]] - cumulative_degrees[graph.indptr[:-1]]
+
+    return np.argsort(-node_neighbours_neighbours, kind='stable').tolist()
+
+
+def create_node_colour_variables(model, node_order, num_nodes, num_colours=None):
     # fine for now
     if num_colours is None:
         num_colours = num_nodes
 
     node_colour_variables = {}
-    for counter, node_index in enumerate(order_nodes_by_neighbours_order_descending(edge_array)):
+    for counter, node_index in enumerate(node_order):
         node_colour_variables[node_index] = model.NewIntVar(0, num_colours - 1, 'node_%i' % counter)
 
     return node_colour_variables, num_colours
 
 
-def create_node_colour_constraints(model, edge_array, node_colour_variables):
-    for edge_index in range(edge_array.shape[0]):
-        model.Add(node_colour_variables[edge_array[edge_index, 0]] != node_colour_variables[edge_array[edge_index, 1]])
+def create_node_colour_constraints(model, graph, node_colour_variables):
+    for v0, v1 in graph.edge_array.tolist():
+        model.Add(node_colour_variables[v0] != node_colour_variables[v1])
 
     return model
 
 
-def create_node_colour_bool_variables(model, edge_array, num_nodes, num_colours=None):
+def create_node_colour_bool_variables(model, node_order, num_nodes, num_colours=None):
     # fine for now
     if num_colours is None:
         num_colours = num_nodes
 
     node_colour_bool_variables = {}
-    for counter, node_index in enumerate(order_nodes_by_neighbours_order_descending(edge_array)):
+    for counter, node_index in enumerate(node_order):
         for colour_index in range(num_colours):
             node_colour_bool_variables[(node_index, colour_index)] = \
                 model.NewBoolVar('node_%i_colour_%i' % (counter, colour_index))
@@ -148,7 +485,7 @@ def create_colour_symmetry_breaking_constraints(model, colour_used_variables, nu
 
 def create_objective(model, colour_used_variables, num_colours):
     # create objective value variable
-    obj_val_var = model.NewIntVar(0, num_colours - 1, 'num_distinct_colours')
+    obj_val_var = model.NewIntVar(0, num_colours, 'num_distinct_colours')
 
     # add constraint to set the variable
     model.Add(obj_val_var == sum([colour_used_variables[colour_index] for colour_index in range(num_colours)]))
@@ -158,19 +495,22 @@ def create_objective(model, colour_used_variables, num_colours):
     return model, obj_val_var
 
 
-def create_model(edge_array, num_nodes, max_obj=None):
+def create_model(graph, num_nodes, max_obj=None):
+    graph = get_colouring_graph(graph, num_nodes)
+    node_order = order_nodes_by_neighbours_order_descending(graph)
+
     # create model
     model = cp_model.CpModel()
 
     # create variables
-    node_colour_variables, num_colours = create_node_colour_variables(model, edge_array, num_nodes, num_colours=max_obj)
-    node_colour_bool_variables = create_node_colour_bool_variables(model, edge_array, num_nodes, num_colours=max_obj)
+    node_colour_variables, num_colours = create_node_colour_variables(model, node_order, num_nodes, num_colours=max_obj)
+    node_colour_bool_variables = create_node_colour_bool_variables(model, node_order, num_nodes, num_colours=max_obj)
     colour_used_variables = create_colour_used_variables(model, num_colours)
 
     # add constraints
     model = create_node_colour_bool_constraints(model, node_colour_bool_variables, node_colour_variables,
                                                 num_nodes, num_colours)
-    model = create_node_colour_constraints(model, edge_array, node_colour_variables)
+    model = create_node_colour_constraints(model, graph, node_colour_variables)
     model = create_colour_used_constraints(model, node_colour_bool_variables, colour_used_variables, num_nodes,
                                            num_colours)
     model = create_colour_symmetry_breaking_constraints(model, colour_used_variables, num_colours)
@@ -182,18 +522,155 @@ def create_model(edge_array, num_nodes, max_obj=None):
     if max_obj is not None:
         model.Add(obj_val_variable <= max_obj)
 
-    model.AddDecisionStrategy([node_colour_variables[node_index]
-                               for node_index in order_nodes_by_neighbours_order_descending(edge_array)],
+    model.AddDecisionStrategy([node_colour_variables[node_index] for node_index in node_order],
                               cp_model.CHOOSE_FIRST, cp_model.SELECT_MIN_VALUE)
 
     return model, node_colour_variables, node_colour_bool_variables, colour_used_variables, obj_val_variable
 
 
-def solve_model(model, max_solve_time=10):
+def create_boolean_model(graph, num_nodes, max_obj=None, clique=None, minimise=True):
+    """
+    Colouring model with only booleans: x[node, colour] with exactly one colour per node, a clause
+    not x[v0, c] or not x[v1, c] per edge and colour, and colour-used literals implied by the x's, in place of
+    the integer node variables and their reified channelling. A clique's nodes are fixed to the first colours.
+    Without minimise it is only a max_obj-colourability feasibility model.
+    """
+
+    graph = get_colouring_graph(graph, num_nodes)
+    node_order = order_nodes_by_neighbours_order_descending(graph)
+    num_colours = num_nodes if max_obj is None else max_obj
+
+    model = cp_model.CpModel()
+
+    node_colour_bool_variables = create_node_colour_bool_variables(model, node_order, num_nodes,
+                                                                   num_colours=num_colours)
+    colour_used_variables = create_colour_used_variables(model, num_colours)
+
+    for node_index in range(num_nodes):
+        model.AddExactlyOne([node_colour_bool_variables[(node_index, colour_index)]
+                             for colour_index in range(num_colours)])
+
+    for v0, v1 in graph.edge_array.tolist():
+        for colour_index in range(num_colours):
+            model.AddBoolOr([node_colour_bool_variables[(v0, colour_index)].Not(),
+                             node_colour_bool_variables[(v1, colour_index)].Not()])
+
+    for (node_index, colour_index), node_colour_bool_variable in node_colour_bool_variables.items():
+        model.AddImplication(node_colour_bool_variable, colour_used_variables[colour_index])
+
+    model = create_colour_symmetry_breaking_constraints(model, colour_used_variables, num_colours)
+
+    obj_val_variable = model.NewIntVar(0, num_colours, 'num_distinct_colours')
+    model.Add(obj_val_variable == sum(colour_used_variables.values()))
+    if minimise:
+        model.Minimize(obj_val_variable)
+
+    if clique:
+        model = create_clique_constraints(model, node_colour_bool_variables, obj_val_variable, clique)
+
+    # nodes in the same order as the integer model, each trying the lowest colour first
+    model.AddDecisionStrategy([node_colour_bool_variables[(node_index, colour_index)]
+                               for node_index in node_order for colour_index in range(num_colours)],
+                              cp_model.CHOOSE_FIRST, cp_model.SELECT_MAX_VALUE)
+
+    return model, node_colour_bool_variables, colour_used_variables, obj_val_variable
+
+
+def relabel_colours_for_clique(colour_array, clique):
+    """
+    Return the colouring with colours swapped so that, where possible, clique node i has colour i as in the
+    models with clique constraints.
+    """
+
+    colour_array = np.array(colour_array, dtype=np.int64)
+
+    for clique_index, node_index in enumerate(clique):
+        colour = colour_array[node_index]
+        # an earlier clique node already took this colour, which only happens with conflicts
+        if colour < clique_index:
+            continue
+        is_colour_array, is_clique_colour_array = colour_array == colour, colour_array == clique_index
+        colour_array[is_colour_array], colour_array[is_clique_colour_array] = clique_index, colour
+
+    return colour_array
+
+
+def add_colouring_hint(model, node_colour_bool_variables, colour_array):
+    model.ClearHints()
+    for (node_index, colour_index), node_colour_bool_variable in node_colour_bool_variables.items():
+        model.AddHint(node_colour_bool_variable, int(colour_array[node_index]) == colour_index)
+
+    return model
+
+
+def solve_descending_k(graph, num_nodes, solution_dict, clique=None, step_time=30, max_time=600):
+    """
+    Look for colourings with fewer and fewer colours, solving a k-colourability feasibility model for each k
+    instead of one optimisation model. The model is built once for the first k and each later k only forbids
+    its highest colour. Each step is hinted with the last colouring after merging its highest colour class
+    away, and gets at most step_time seconds, with the build charged to max_time. Stops at the first k proven
+    infeasible, which proves the last colouring optimal, as does reaching the clique size, or when a step
+    runs out of time.
+    """
+
+    start_time = time.time()
+    graph = get_colouring_graph(graph, num_nodes)
+    clique = clique or []
+
+    best_solution_dict = dict(solution_dict)
+    best_solution_dict['is_provably_optimal'] = best_solution_dict['num_colours'] <= max(len(clique), 1)
+    step_list = []
+
+    if best_solution_dict['is_provably_optimal']:
+        best_solution_dict['step_list'] = step_list
+        return best_solution_dict
+
+    model, ncb_vars, cu_vars, obj_val_var = create_boolean_model(graph, num_nodes,
+                                                                 max_obj=best_solution_dict['num_colours'] - 1,
+                                                                 clique=clique, minimise=False)
+    num_allowed_colours = len(cu_vars)
+
+    while not best_solution_dict['is_provably_optimal']:
+        remaining_time = max_time - (time.time() - start_time)
+        if remaining_time <= 0:
+            break
+
+        num_colours = best_solution_dict['num_colours'] - 1
+        hint_array = merge_highest_colour(graph, best_solution_dict['solution_array'], num_colours + 1)
+        hint_array = relabel_colours_for_clique(hint_array, clique)
+
+        # colours are used in order, so forbidding colour k leaves exactly the k-colourings. a found colouring
+        # can use fewer colours than asked, so every colour it skipped is forbidden too
+        for colour_index in range(num_colours, num_allowed_colours):
+            model.Add(cu_vars[colour_index] == 0)
+        num_allowed_colours = num_colours
+        model = add_colouring_hint(model, ncb_vars, hint_array)
+
+        step_start_time = time.time()
+        # the default search makes more use of the hint than the fixed node order
+        model, solver, status = solve_model(model, max_solve_time=min(step_time, remaining_time),
+                                            fixed_search=False)
+        step_list.append((num_colours, solver.StatusName(status), time.time() - step_start_time))
+
+        if status == cp_model.INFEASIBLE:
+            best_solution_dict['is_provably_optimal'] = True
+        elif status in (cp_model.OPTIMAL, cp_model.FEASIBLE):
+            best_solution_dict = get_boolean_solution_dict(ncb_vars, solver, num_nodes)
+            best_solution_dict['is_provably_optimal'] = best_solution_dict['num_colours'] <= len(clique)
+        else:
+            break
+
+    best_solution_dict['step_list'] = step_list
+
+    return best_solution_dict
+
+
+def solve_model(model, max_solve_time=10, fixed_search=True):
     # solve model
     solver = cp_model.CpSolver()
     solver.parameters.max_time_in_seconds = max_solve_time
-    solver.parameters.search_branching = cp_model.FIXED_SEARCH
+    if fixed_search:
+        solver.parameters.search_branching = cp_model.FIXED_SEARCH
     solver.parameters.num_search_workers = 16
     solver.parameters.randomize_search = True
     status = solver.Solve(model)
@@ -228,3 +705,21 @@ def get_solution_dict(variables, solver, num_nodes):
     }
 
     return solution_dict
+
+
+def get_boolean_solution_dict(node_colour_bool_variables, solver, num_nodes):
+    solution_array = np.zeros(num_nodes)
+
+    for (node_index, colour_index), node_colour_bool_variable in node_colour_bool_variables.items():
+        if solver.BooleanValue(node_colour_bool_variable):
+            solution_array[node_index] = colour_index
+
+    # renumber the colours used as 0, 1, ...
+    _, solution_array = np.unique(solution_array, return_inverse=True)
+
+    solution_dict = {
+        'solution_array': solution_array.astype(int),
+        'num_colours': int(solution_array.max()) + 1 if num_nodes else 0
+    }
+
+    return solution_dict